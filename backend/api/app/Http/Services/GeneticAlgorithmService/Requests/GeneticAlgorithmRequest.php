@@ -20,10 +20,12 @@ public function __construct(string $serviceUrl)
     public function sendRequest(float $fitnessThreshold, int $historyId): array
     {
         try {
-            $response = Http::timeout(18000)->get($this->serviceUrl . '/find-best-supplier', [
-                'fitness_threshold' => $fitnessThreshold,
-                'history_id' => $historyId
-            ]);
+            $response = Http::timeout(30)
+                ->withQueryParameters([
+                    'fitness_threshold' => $fitnessThreshold,
+                    'history_id' => $historyId
+                ])
+                ->post($this->serviceUrl . '/find-best-supplier/jobs');
 
             if ($response->failed()) {
                 Log::error("GeneticAlgorithmRequest[sendRequest]", [
@@ -0,0 +1,23 @@
+<?php
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    public function up(): void
+    {
+        Schema::table('price_forecasting_results', function (Blueprint $table) {
+            $table->unsignedBigInteger('source_max_order_id')->nullable()->after('brand');
+            $table->timestamp('source_last_date_added')->nullable()->after('source_max_order_id');
+        });
+    }
+
+    public function down(): void
+    {
+        Schema::table('price_forecasting_results', function (Blueprint $table) {
+            $table->dropColumn(['source_max_order_id', 'source_last_date_added']);
+        });
+    }
+};
@@ -1,12 +1,15 @@
 import os
 import sys
 import logging
+import httpx
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from services.genetic_algorithm_logic import GeneticAlgorithmService
+from services.job_manager import JobManager
 from services.database import init_db_pool, close_db_pool
 from services.connections import init_redis_connection, close_redis_connection, get_redis_client
 
@@ -18,10 +21,12 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 genetic_service = None
+job_manager = None
+http_client = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global genetic_service
+    global genetic_service, job_manager, http_client
     
     try:
         init_redis_connection()
@@ -37,17 +42,69 @@ async def lifespan(app: FastAPI):
         logger.error(f"Main[lifespan] Failed to initialize database pool: {str(e)}")
         raise
     
+    try:
+        http_client = httpx.Client(
+            timeout=httpx.Timeout(10.0, connect=2.0),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv('SUPPLIER_RATING_MAX_CONNECTIONS', '20')),
+                max_keepalive_connections=int(os.getenv('SUPPLIER_RATING_MAX_KEEPALIVE', '10'))
+            )
+        )
+        logger.info("Main[lifespan] HTTP client initialized")
+    except Exception as e:
+        logger.error(f"Main[lifespan] Failed to initialize HTTP client: {str(e)}")
+        raise
+    
     try:
         redis_client = get_redis_client()
         supplier_rating_url = os.getenv('SUPPLIER_RATING_SERVICE_URL', 'http://diplom_supplier_rating_service:8001')
-        genetic_service = GeneticAlgorithmService(redis_client, supplier_rating_url)
-        logger.info("Main[lifespan] GeneticAlgorithmService initialized")
+        engine = os.getenv('GENETIC_ALGORITHM_ENGINE', 'deap')
+        rating_cache_ttl = int(os.getenv('SUPPLIER_RATING_CACHE_TTL', '300'))
+        ranking_cache_ttl = int(os.getenv('GENETIC_ALGORITHM_RANKING_CACHE_TTL', '86400'))
+        workers = int(os.getenv('GENETIC_ALGORITHM_WORKERS', str(os.cpu_count() or 1)))
+        genetic_service = GeneticAlgorithmService(
+            redis_client, 
+            supplier_rating_url, 
+            engine, 
+            http_client, 
+            rating_cache_ttl, 
+            ranking_cache_ttl,
+            workers
+        )
+        logger.info(f"Main[lifespan] GeneticAlgorithmService initialized with engine={genetic_service.engine}")
     except Exception as e:
         logger.error(f"Main[lifespan] Failed to initialize GeneticAlgorithmService: {str(e)}")
         raise
     
+    try:
+        job_workers = int(os.getenv('GENETIC_ALGORITHM_JOB_WORKERS', '1'))
+        job_manager = JobManager(get_redis_client(), max_workers=job_workers)
+        job_manager.fail_orphaned_jobs(genetic_service.mark_history_failed)
+        logger.info(f"Main[lifespan] JobManager initialized with {job_workers} workers")
+    except Exception as e:
+        logger.error(f"Main[lifespan] Failed to initialize JobManager: {str(e)}")
+        raise
+    
     yield
     
+    try:
+        job_manager.shutdown()
+        logger.info("Main[lifespan] JobManager shut down")
+    except Exception as e:
+        logger.error(f"Main[lifespan] Error shutting down JobManager: {str(e)}")
+    
+    try:
+        genetic_service.shutdown()
+        logger.info("Main[lifespan] GeneticAlgorithmService process pool shut down")
+    except Exception as e:
+        logger.error(f"Main[lifespan] Error shutting down GeneticAlgorithmService: {str(e)}")
+    
+    try:
+        http_client.close()
+        logger.info("Main[lifespan] HTTP client closed")
+    except Exception as e:
+        logger.error(f"Main[lifespan] Error closing HTTP client: {str(e)}")
+    
     try:
         close_redis_connection()
         logger.info("Main[lifespan] Redis connection closed")
@@ -110,11 +167,16 @@ async def health():
     }
 
 @app.get("/find-best-supplier")
-async def find_best_supplier(fitness_threshold: float = 0.5, history_id: int = None):
+async def find_best_supplier(fitness_threshold: float = 0.5, history_id: int = None, engine: str = None):
     if not genetic_service:
         return {"success": False, "error": "Genetic algorithm service not initialized"}
     try:
-        result = genetic_service.find_best_supplier(fitness_threshold=fitness_threshold, history_id=history_id)
+        result = await run_in_threadpool(
+            genetic_service.find_best_supplier,
+            fitness_threshold=fitness_threshold,
+            history_id=history_id,
+            engine=engine
+        )
         if result.get('success', False):
             return {"success": True}
         else:
@@ -123,6 +185,35 @@ async def find_best_supplier(fitness_threshold: float = 0.5, history_id: int = N
         logger.error(f"Main[find_best_supplier] error: {str(e)}")
         return {"success": False, "error": str(e)}
 
+@app.post("/find-best-supplier/jobs")
+async def submit_find_best_supplier_job(fitness_threshold: float = 0.5, history_id: int = None, engine: str = None):
+    if not genetic_service or not job_manager:
+        return {"success": False, "error": "Genetic algorithm service not initialized"}
+    try:
+        job_id = job_manager.submit(
+            genetic_service.find_best_supplier,
+            fitness_threshold=fitness_threshold,
+            history_id=history_id,
+            engine=engine
+        )
+        return {"success": True, "job_id": job_id}
+    except Exception as e:
+        logger.error(f"Main[submit_find_best_supplier_job] error: {str(e)}")
+        return {"success": False, "error": str(e)}
+
+@app.get("/find-best-supplier/jobs/{job_id}")
+async def get_find_best_supplier_job(job_id: str):
+    if not job_manager:
+        return {"success": False, "error": "Genetic algorithm service not initialized"}
+    try:
+        job_status = job_manager.get_status(job_id)
+        if job_status is None:
+            return {"success": False, "error": "Job not found"}
+        return {"success": True, "job": job_status}
+    except Exception as e:
+        logger.error(f"Main[get_find_best_supplier_job] error: {str(e)}")
+        return {"success": False, "error": str(e)}
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv('SERVICE_PORT', 8006))
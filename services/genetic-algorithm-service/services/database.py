@@ -83,6 +83,21 @@ def get_db_cursor():
         finally:
             cursor.close()
 
+@contextmanager
+def get_db_server_cursor(name, itersize=10000):
+    with get_db_connection() as conn:
+        cursor = conn.cursor(name=name)
+        cursor.itersize = itersize
+        try:
+            yield cursor
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"DatabaseConnectionPool[get_db_server_cursor] Error: {str(e)}")
+            raise
+        finally:
+            cursor.close()
+
 def check_db_connection():
     try:
         with get_db_connection() as conn:
@@ -1,20 +1,53 @@
 import logging
 import time
 import random
+import threading
+import multiprocessing
 import httpx
 import json
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import numpy as np
 from deap import base, creator, tools, algorithms
-from .database import get_db_cursor
+from psycopg2.extras import execute_values
+from .database import get_db_cursor, get_db_server_cursor
 from .connections import get_redis_client
 
 logger = logging.getLogger(__name__)
 
+SAVE_BATCH_SIZE = 5000
+FITNESS_WEIGHTS = [0.2, 0.25, 0.15, 0.15, 0.1, 0.15]
+ENGINES = ('deap', 'exact')
+
 class GeneticAlgorithmService:
-    def __init__(self, redis_client=None, supplier_rating_url=None):
+    def __init__(self, redis_client=None, supplier_rating_url=None, engine='deap', http_client=None, rating_cache_ttl=300, ranking_cache_ttl=86400, workers=1):
         self.redis_client = redis_client
         self.supplier_rating_url = supplier_rating_url
+        self.engine = engine if engine in ENGINES else 'deap'
+        self.http_client = http_client
+        self.rating_cache_ttl = rating_cache_ttl
+        self.ranking_cache_ttl = ranking_cache_ttl
+        self._rating_cache = {}
+        self._rating_cache_lock = threading.Lock()
+        self.workers = max(1, workers)
+        self._process_pool = None
+        self._process_pool_lock = threading.Lock()
+    
+    def _get_process_pool(self):
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f"GeneticAlgorithmService[_get_process_pool] Process pool started with {self.workers} workers")
+            return self._process_pool
+    
+    def shutdown(self):
+        with self._process_pool_lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False, cancel_futures=True)
+                self._process_pool = None
     
     def _get_suppliers_data(self):
         query = """
@@ -113,7 +146,7 @@ class GeneticAlgorithmService:
         orders_score = features[4]
         revenue_score = features[5]
         
-        weights = [0.2, 0.25, 0.15, 0.15, 0.1, 0.15]
+        weights = FITNESS_WEIGHTS
         
         fitness = (
             price_score * weights[0] +
@@ -276,15 +309,102 @@ class GeneticAlgorithmService:
         
         return suppliers[best_supplier_idx]
     
+    def _calculate_fitness_vector(self, items):
+        features = np.array([item['normalized_features'] for item in items], dtype=np.float64)
+        features[:, [0, 2, 3]] = 1.0 - features[:, [0, 2, 3]]
+        return features @ np.array(FITNESS_WEIGHTS, dtype=np.float64)
+    
+    def _ranking_order(self, fitness_vector):
+        return np.argsort(-fitness_vector, kind='stable')
+    
+    def _build_metrics(self, item):
+        return {
+            'avg_price': float(item['avg_price']),
+            'success_rate': float(item['success_rate']),
+            'avg_delivery_time': float(item['avg_delivery_time']),
+            'denial_rate': float(item['denial_rate']),
+            'orders_count': int(item['orders_count']),
+            'total_revenue': float(item['total_revenue'])
+        }
+    
+    def _top_k_indices(self, fitness_vector, k):
+        k = min(k, len(fitness_vector))
+        if k <= 0:
+            return np.array([], dtype=np.int64)
+        if k < len(fitness_vector):
+            candidates = np.argpartition(-fitness_vector, k - 1)[:k]
+        else:
+            candidates = np.arange(len(fitness_vector))
+        return candidates[np.argsort(-fitness_vector[candidates], kind='stable')]
+    
+    def _run_exact_ranking(self, items, top_k=10):
+        if len(items) == 0:
+            return None
+        
+        fitness_vector = self._calculate_fitness_vector(items)
+        best_idx = int(np.argmax(fitness_vector))
+        top_indices = self._top_k_indices(fitness_vector, top_k)
+        
+        logger.info(f"GeneticAlgorithmService[_run_exact_ranking] Ranked {len(items)} items, best index={best_idx}, fitness={float(fitness_vector[best_idx])}, top_{len(top_indices)}={top_indices.tolist()}")
+        
+        return {
+            'best_index': best_idx,
+            'fitness_vector': fitness_vector,
+            'top_indices': top_indices
+        }
+    
+    def _select_best(self, items, engine='deap', top_k=10):
+        if engine == 'exact':
+            return self._run_exact_ranking(items, top_k)
+        
+        best_item = self._run_genetic_algorithm(items)
+        if best_item is None:
+            return None
+        
+        fitness_vector = self._calculate_fitness_vector(items)
+        return {
+            'best_index': next(idx for idx, item in enumerate(items) if item is best_item),
+            'fitness_vector': fitness_vector,
+            'top_indices': self._top_k_indices(fitness_vector, top_k)
+        }
+    
+    def _get_http_client(self):
+        if self.http_client is None:
+            self.http_client = httpx.Client(
+                timeout=httpx.Timeout(10.0, connect=2.0),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return self.http_client
+    
+    def _get_cached_rating(self, supplier_id):
+        with self._rating_cache_lock:
+            cached = self._rating_cache.get(supplier_id)
+            if cached is None:
+                return None
+            expires_at, rating = cached
+            if expires_at < time.monotonic():
+                del self._rating_cache[supplier_id]
+                return None
+            return rating
+    
+    def _cache_rating(self, supplier_id, rating):
+        with self._rating_cache_lock:
+            self._rating_cache[supplier_id] = (time.monotonic() + self.rating_cache_ttl, rating)
+    
     def _get_supplier_rating(self, supplier_id):
+        cached_rating = self._get_cached_rating(supplier_id)
+        if cached_rating is not None:
+            return cached_rating
+        
         try:
-            with httpx.Client(timeout=10.0) as client:
-                response = client.post(
-                    f"{self.supplier_rating_url}/analyze",
-                    json={"supplier_id": supplier_id}
-                )
-                if response.status_code == 200:
-                    return response.json()
+            response = self._get_http_client().post(
+                f"{self.supplier_rating_url}/analyze",
+                json={"supplier_id": supplier_id}
+            )
+            if response.status_code == 200:
+                rating = response.json()
+                self._cache_rating(supplier_id, rating)
+                return rating
         except Exception as e:
             logger.error(f'GeneticAlgorithmService[_get_supplier_rating] error: {str(e)}')
         return None
@@ -328,17 +448,19 @@ class GeneticAlgorithmService:
                 (run_id, supplier_id, service_name, name, fitness_score, has_combinations, rank, 
                  avg_price, success_rate, avg_delivery_time, denial_rate, orders_count, total_revenue, 
                  created_at, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
-                RETURNING id
+                VALUES %s
+                RETURNING id, supplier_id
             """
+            supplier_ranking_template = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())"
             
             supplier_ranking_ids = {}
             suppliers_data_dict = {s['id']: s for s in suppliers_data}
             
+            supplier_ranking_rows = []
             for rank, supplier in enumerate(all_ranked, 1):
                 has_combinations = supplier['id'] in suppliers_with_combinations_ids
                 supplier_data = suppliers_data_dict.get(supplier['id'], {})
-                cursor.execute(supplier_ranking_query, (
+                supplier_ranking_rows.append((
                     run_id,
                     supplier['id'],
                     supplier.get('service_name', ''),
@@ -353,14 +475,28 @@ class GeneticAlgorithmService:
                     int(supplier_data.get('orders_count', 0)),
                     float(supplier_data.get('total_revenue', 0))
                 ))
-                supplier_ranking_id = cursor.fetchone()[0]
-                supplier_ranking_ids[supplier['id']] = supplier_ranking_id
+            
+            if supplier_ranking_rows:
+                returned_ids = execute_values(
+                    cursor, 
+                    supplier_ranking_query, 
+                    supplier_ranking_rows, 
+                    template=supplier_ranking_template, 
+                    page_size=SAVE_BATCH_SIZE, 
+                    fetch=True
+                )
+                for supplier_ranking_id, supplier_id in returned_ids:
+                    supplier_ranking_ids[int(supplier_id)] = supplier_ranking_id
             
             article_brand_query = """
                 INSERT INTO genetic_algorithm_article_brand_rankings 
                 (supplier_ranking_id, article, brand, fitness_score, orders_count, success_rate, avg_price, avg_delivery_time, total_revenue, denial_rate, rank, created_at, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
+                VALUES %s
             """
+            article_brand_template = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())"
+            
+            article_brand_rows = []
+            article_brand_rows_count = 0
             
             for supplier in suppliers_with_combinations:
                 supplier_id = supplier['id']
@@ -372,7 +508,7 @@ class GeneticAlgorithmService:
                 
                 for rank, combo in enumerate(combinations, 1):
                     metrics = combo.get('metrics', {})
-                    cursor.execute(article_brand_query, (
+                    article_brand_rows.append((
                         supplier_ranking_id,
                         combo['article'],
                         combo['brand'],
@@ -385,6 +521,17 @@ class GeneticAlgorithmService:
                         metrics.get('denial_rate', 0.0),
                         rank
                     ))
+                    
+                    if len(article_brand_rows) >= SAVE_BATCH_SIZE:
+                        execute_values(cursor, article_brand_query, article_brand_rows, template=article_brand_template, page_size=SAVE_BATCH_SIZE)
+                        article_brand_rows_count += len(article_brand_rows)
+                        article_brand_rows = []
+            
+            if article_brand_rows:
+                execute_values(cursor, article_brand_query, article_brand_rows, template=article_brand_template, page_size=SAVE_BATCH_SIZE)
+                article_brand_rows_count += len(article_brand_rows)
+            
+            logger.info(f"GeneticAlgorithmService[_save_to_database] Saved run_id={run_id}: {len(supplier_ranking_ids)} supplier rankings, {article_brand_rows_count} article/brand rankings")
             
             if history_id:
                 status_query = """
@@ -434,21 +581,85 @@ class GeneticAlgorithmService:
         
         logger.info(f"GeneticAlgorithmService[_get_article_brand_data] service_name={service_name}, found {len(rows)} combinations")
         
-        combinations = []
-        for row in rows:
-            combination = dict(zip(columns, row))
-            combination['orders_count'] = int(combination['orders_count'])
-            combination['total_revenue'] = float(combination['total_revenue'])
-            combination['avg_price'] = float(combination['avg_price'])
-            combination['success_rate'] = float(combination['success_rate'])
-            combination['avg_delivery_time'] = float(combination['avg_delivery_time'])
-            combination['denial_rate'] = float(combination['denial_rate'])
-            combinations.append(combination)
+        return [self._parse_combination_row(dict(zip(columns, row))) for row in rows]
+    
+    def _parse_combination_row(self, combination):
+        combination['orders_count'] = int(combination['orders_count'])
+        combination['total_revenue'] = float(combination['total_revenue'])
+        combination['avg_price'] = float(combination['avg_price'])
+        combination['success_rate'] = float(combination['success_rate'])
+        combination['avg_delivery_time'] = float(combination['avg_delivery_time'])
+        combination['denial_rate'] = float(combination['denial_rate'])
+        return combination
+    
+    def _get_article_brand_data_bulk(self, service_names):
+        if not service_names:
+            return {}
         
-        return combinations
+        query = """
+            WITH filtered_distributors AS (
+                SELECT 
+                    product_distributor.id,
+                    COALESCE(product_distributor.remote_params->>'service', product_distributor.name) as service_name
+                FROM product_distributor
+                WHERE COALESCE(product_distributor.remote_params->>'service', product_distributor.name) = ANY(%s)
+            ),
+            aggregated AS (
+                SELECT 
+                    filtered_distributors.service_name,
+                    order_product.article,
+                    order_product.brand,
+                    COUNT(order_product.id) as orders_count,
+                    COALESCE(SUM(order_product.total), 0) as total_revenue,
+                    COALESCE(AVG(order_product.price), 0) as avg_price,
+                    COALESCE(
+                        SUM(CASE WHEN order_product.is_denied = 0 AND order_product.is_archived = 0 THEN 1 ELSE 0 END)::float / 
+                        NULLIF(COUNT(order_product.id), 0) * 100, 
+                        0
+                    ) as success_rate,
+                    COALESCE(AVG(order_product.deliverytime_max), 0) as avg_delivery_time,
+                    COALESCE(
+                        SUM(CASE WHEN order_product.is_denied = 1 THEN 1 ELSE 0 END)::float / 
+                        NULLIF(COUNT(order_product.id), 0) * 100, 
+                        0
+                    ) as denial_rate,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY filtered_distributors.service_name 
+                        ORDER BY COUNT(order_product.id) DESC
+                    ) as combination_rank
+                FROM order_product
+                JOIN filtered_distributors ON order_product.distributor_id = filtered_distributors.id
+                GROUP BY filtered_distributors.service_name, order_product.article, order_product.brand
+                HAVING COUNT(order_product.id) > 0
+            )
+            SELECT 
+                service_name, article, brand, orders_count, total_revenue, avg_price, 
+                success_rate, avg_delivery_time, denial_rate
+            FROM aggregated
+            WHERE combination_rank <= 10000
+            ORDER BY service_name, combination_rank
+        """
+        
+        article_brand_index = {service_name: [] for service_name in service_names}
+        rows_count = 0
+        
+        with get_db_server_cursor('genetic_algorithm_article_brands') as cursor:
+            cursor.execute(query, (list(service_names),))
+            columns = None
+            for row in cursor:
+                if columns is None:
+                    columns = [desc[0] for desc in cursor.description]
+                combination = self._parse_combination_row(dict(zip(columns, row)))
+                article_brand_index.setdefault(combination.pop('service_name'), []).append(combination)
+                rows_count += 1
+        
+        logger.info(f"GeneticAlgorithmService[_get_article_brand_data_bulk] Loaded {rows_count} combinations for {len(service_names)} suppliers")
+        
+        return article_brand_index
     
-    def _analyze_supplier_combinations(self, supplier, fitness_threshold=0.5):
-        article_brand_data = self._get_article_brand_data(supplier['id'], supplier['service_name'])
+    def _analyze_supplier_combinations(self, supplier, fitness_threshold=0.5, engine='deap', article_brand_data=None):
+        if article_brand_data is None:
+            article_brand_data = self._get_article_brand_data(supplier['id'], supplier['service_name'])
         
         logger.info(f'GeneticAlgorithmService[_analyze_supplier_combinations] supplier_id={supplier["id"]}, service_name={supplier["service_name"]}, combinations_count={len(article_brand_data)}')
         
@@ -471,61 +682,210 @@ class GeneticAlgorithmService:
                 }
             }]
         
-        if len(article_brand_data) == 2:
-            normalized_combinations = self._normalize_features(article_brand_data)
-            all_ranked = []
-            for combination in normalized_combinations:
-                fitness = self._fitness_function([normalized_combinations.index(combination)], normalized_combinations)[0]
-                all_ranked.append({
-                    'article': combination['article'],
-                    'brand': combination['brand'],
-                    'fitness_score': float(fitness),
-                    'metrics': {
-                        'avg_price': float(combination['avg_price']),
-                        'success_rate': float(combination['success_rate']),
-                        'avg_delivery_time': float(combination['avg_delivery_time']),
-                        'denial_rate': float(combination['denial_rate']),
-                        'orders_count': int(combination['orders_count']),
-                        'total_revenue': float(combination['total_revenue'])
-                    }
-                })
-            all_ranked.sort(key=lambda x: x['fitness_score'], reverse=True)
-            return all_ranked
-        
         normalized_combinations = self._normalize_features(article_brand_data)
-        best_combination = self._run_genetic_algorithm(normalized_combinations)
         
-        if not best_combination:
-            return []
+        if len(normalized_combinations) > 2:
+            selection = self._select_best(normalized_combinations, engine)
+            if not selection:
+                return []
+            fitness_vector = selection['fitness_vector']
+        else:
+            fitness_vector = self._calculate_fitness_vector(normalized_combinations)
         
-        all_ranked = []
-        for combination in normalized_combinations:
-            fitness = self._fitness_function([normalized_combinations.index(combination)], normalized_combinations)[0]
-            all_ranked.append({
-                'article': combination['article'],
-                'brand': combination['brand'],
-                'fitness_score': float(fitness),
-                'metrics': {
-                    'avg_price': float(combination['avg_price']),
-                    'success_rate': float(combination['success_rate']),
-                    'avg_delivery_time': float(combination['avg_delivery_time']),
-                    'denial_rate': float(combination['denial_rate']),
-                    'orders_count': int(combination['orders_count']),
-                    'total_revenue': float(combination['total_revenue'])
-                }
-            })
+        return [
+            {
+                'article': normalized_combinations[idx]['article'],
+                'brand': normalized_combinations[idx]['brand'],
+                'fitness_score': float(fitness_vector[idx]),
+                'metrics': self._build_metrics(normalized_combinations[idx])
+            }
+            for idx in self._ranking_order(fitness_vector)
+        ]
+    
+    def _compute_supplier_combinations(self, suppliers, engine, article_brand_index, progress_callback=None):
+        computed_combinations = {}
+        
+        if self.workers > 1 and len(suppliers) > 1:
+            try:
+                results = self._get_process_pool().map(
+                    _analyze_supplier_combinations_task,
+                    suppliers,
+                    [engine] * len(suppliers),
+                    [article_brand_index.get(s['service_name'], []) for s in suppliers]
+                )
+                for position, (supplier_id, combinations) in enumerate(results, 1):
+                    computed_combinations[supplier_id] = combinations
+                    self._report_progress(progress_callback, 'analyzing_combinations', 0.2 + 0.7 * position / len(suppliers))
+            except Exception as e:
+                logger.error(f'GeneticAlgorithmService[_compute_supplier_combinations] process pool error: {str(e)}, falling back to sequential analysis')
+        
+        for position, supplier in enumerate(suppliers, 1):
+            if supplier['id'] in computed_combinations:
+                continue
+            computed_combinations[supplier['id']] = self._analyze_supplier_combinations(
+                supplier, 
+                engine=engine, 
+                article_brand_data=article_brand_index.get(supplier['service_name'], [])
+            )
+            self._report_progress(progress_callback, 'analyzing_combinations', 0.2 + 0.7 * position / len(suppliers))
         
-        all_ranked.sort(key=lambda x: x['fitness_score'], reverse=True)
+        return computed_combinations
+    
+    def _get_data_watermark(self):
+        if not self.redis_client or self.ranking_cache_ttl <= 0:
+            return None
+        
+        orders_query = """
+            SELECT
+                COUNT(*),
+                MAX(order_product.id),
+                COALESCE(SUM(hashtext(concat_ws('|',
+                    order_product.id,
+                    order_product.distributor_id,
+                    order_product.article,
+                    order_product.brand,
+                    order_product.price,
+                    order_product.total,
+                    order_product.is_denied,
+                    order_product.is_archived,
+                    order_product.deliverytime_max,
+                    order_product.date_added
+                ))::bigint), 0)
+            FROM order_product
+        """
+        
+        distributors_query = """
+            SELECT
+                COUNT(*),
+                COALESCE(SUM(hashtext(concat_ws('|',
+                    product_distributor.id,
+                    product_distributor.name,
+                    product_distributor.remote_params->>'service'
+                ))::bigint), 0)
+            FROM product_distributor
+        """
         
-        return all_ranked
+        try:
+            with get_db_cursor() as cursor:
+                cursor.execute(orders_query)
+                orders_count, max_id, orders_checksum = cursor.fetchone()
+                cursor.execute(distributors_query)
+                distributors_count, distributors_checksum = cursor.fetchone()
+        except Exception as e:
+            logger.error(f'GeneticAlgorithmService[_get_data_watermark] error: {str(e)}')
+            return None
+        
+        if max_id is None:
+            return None
+        
+        return f"{max_id}:{orders_count}:{orders_checksum}:{distributors_count}:{distributors_checksum}"
+    
+    def _ranking_cache_key(self, engine, watermark):
+        return f"genetic_algorithm:ranking:{engine}:{watermark}"
     
-    def find_best_supplier(self, fitness_threshold=0.5, history_id=None):
+    def _combinations_cache_key(self, engine, watermark, supplier_id):
+        return f"genetic_algorithm:combinations:{engine}:{watermark}:{supplier_id}"
+    
+    def _get_cached_ranking(self, engine, watermark):
+        if watermark is None:
+            return None
+        try:
+            cached = self.redis_client.get(self._ranking_cache_key(engine, watermark))
+            if cached:
+                return json.loads(cached)
+        except Exception as e:
+            logger.error(f'GeneticAlgorithmService[_get_cached_ranking] error: {str(e)}')
+        return None
+    
+    def _cache_ranking(self, engine, watermark, suppliers, all_ranked, best_supplier_id):
+        if watermark is None:
+            return
+        try:
+            self.redis_client.setex(
+                self._ranking_cache_key(engine, watermark),
+                self.ranking_cache_ttl,
+                json.dumps({
+                    'suppliers': suppliers,
+                    'all_ranked': all_ranked,
+                    'best_supplier_id': best_supplier_id
+                })
+            )
+        except Exception as e:
+            logger.error(f'GeneticAlgorithmService[_cache_ranking] error: {str(e)}')
+    
+    def _get_cached_combinations(self, engine, watermark, supplier_ids):
+        if watermark is None or not supplier_ids:
+            return {}
+        try:
+            keys = [self._combinations_cache_key(engine, watermark, supplier_id) for supplier_id in supplier_ids]
+            values = self.redis_client.mget(keys)
+        except Exception as e:
+            logger.error(f'GeneticAlgorithmService[_get_cached_combinations] error: {str(e)}')
+            return {}
+        return {
+            supplier_id: json.loads(value) 
+            for supplier_id, value in zip(supplier_ids, values) 
+            if value
+        }
+    
+    def _cache_combinations(self, engine, watermark, combinations_by_supplier):
+        if watermark is None or not combinations_by_supplier:
+            return
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for supplier_id, combinations in combinations_by_supplier.items():
+                pipeline.setex(
+                    self._combinations_cache_key(engine, watermark, supplier_id),
+                    self.ranking_cache_ttl,
+                    json.dumps(combinations)
+                )
+            pipeline.execute()
+        except Exception as e:
+            logger.error(f'GeneticAlgorithmService[_cache_combinations] error: {str(e)}')
+    
+    def _report_progress(self, progress_callback, stage, progress):
+        if progress_callback is None:
+            return
+        try:
+            progress_callback(stage, progress)
+        except Exception as e:
+            logger.error(f'GeneticAlgorithmService[_report_progress] error: {str(e)}')
+    
+    def mark_history_failed(self, history_id):
+        try:
+            with get_db_cursor() as cursor:
+                cursor.execute("""
+                    UPDATE analysis_history 
+                    SET status = 'FAILED', updated_at = NOW()
+                    WHERE id = %s AND status = 'IN_PROCESS'
+                """, (history_id,))
+                logger.info(f"GeneticAlgorithmService[mark_history_failed] Updated analysis_history status to FAILED for history_id={history_id}")
+        except Exception as e:
+            logger.error(f'GeneticAlgorithmService[mark_history_failed] Failed to update status: {str(e)}')
+    
+    def find_best_supplier(self, fitness_threshold=0.5, history_id=None, engine=None, progress_callback=None):
         start_time = time.time()
+        engine = engine or self.engine
+        
+        if engine not in ENGINES:
+            return {
+                'success': False,
+                'error': f'Неизвестный движок: {engine}'
+            }
         
         try:
-            logger.info(f"GeneticAlgorithmService[find_best_supplier] Starting with fitness_threshold={fitness_threshold}, history_id={history_id}")
-            suppliers_data = self._get_suppliers_data()
-            logger.info(f"GeneticAlgorithmService[find_best_supplier] Loaded {len(suppliers_data)} suppliers")
+            logger.info(f"GeneticAlgorithmService[find_best_supplier] Starting with fitness_threshold={fitness_threshold}, history_id={history_id}, engine={engine}")
+            self._report_progress(progress_callback, 'loading_suppliers', 0.0)
+            watermark = self._get_data_watermark()
+            cached_ranking = self._get_cached_ranking(engine, watermark)
+            
+            if cached_ranking:
+                suppliers_data = cached_ranking['suppliers']
+                logger.info(f"GeneticAlgorithmService[find_best_supplier] Loaded {len(suppliers_data)} suppliers from ranking cache, watermark={watermark}")
+            else:
+                suppliers_data = self._get_suppliers_data()
+                logger.info(f"GeneticAlgorithmService[find_best_supplier] Loaded {len(suppliers_data)} suppliers")
+            self._report_progress(progress_callback, 'ranking_suppliers', 0.05)
             
             if len(suppliers_data) == 0:
                 if history_id:
@@ -550,7 +910,7 @@ class GeneticAlgorithmService:
             if len(suppliers_data) == 1:
                 best_supplier = suppliers_data[0]
                 rating = self._get_supplier_rating(best_supplier['id'])
-                combinations = self._analyze_supplier_combinations(best_supplier, fitness_threshold)
+                combinations = self._analyze_supplier_combinations(best_supplier, fitness_threshold, engine)
                 
                 result_data = {
                     'success': True,
@@ -591,74 +951,90 @@ class GeneticAlgorithmService:
                 
                 metadata = {
                     'method': 'genetic_algorithm',
+                    'engine': engine,
                     'fitness_threshold': fitness_threshold,
                     'timestamp': datetime.utcnow().isoformat() + 'Z',
                     'execution_time': round(time.time() - start_time, 2),
                     'suppliers_count': 1
                 }
                 
+                self._report_progress(progress_callback, 'saving', 0.9)
                 self._save_to_database(result_data, metadata, suppliers_data, history_id)
                 
                 return result_data
             
-            normalized_suppliers = self._normalize_features(suppliers_data)
-            logger.info(f"GeneticAlgorithmService[find_best_supplier] Running genetic algorithm to find best supplier")
-            best_supplier = self._run_genetic_algorithm(normalized_suppliers)
+            if cached_ranking:
+                normalized_suppliers = suppliers_data
+                best_supplier_idx = next(
+                    (idx for idx, s in enumerate(normalized_suppliers) if s['id'] == cached_ranking['best_supplier_id']), 
+                    None
+                )
+                fitness_vector = self._calculate_fitness_vector(normalized_suppliers)
+                all_ranked = cached_ranking['all_ranked']
+            else:
+                normalized_suppliers = self._normalize_features(suppliers_data)
+                logger.info(f"GeneticAlgorithmService[find_best_supplier] Running {engine} engine to find best supplier")
+                selection = self._select_best(normalized_suppliers, engine)
+                best_supplier_idx = selection['best_index'] if selection else None
+                fitness_vector = selection['fitness_vector'] if selection else None
+                all_ranked = None
             
-            if not best_supplier:
+            if best_supplier_idx is None:
                 return {
                     'success': False,
                     'error': 'Ошибка при выполнении генетического алгоритма'
                 }
             
+            best_supplier = normalized_suppliers[best_supplier_idx]
             logger.info(f"GeneticAlgorithmService[find_best_supplier] Best supplier found: id={best_supplier['id']}, service_name={best_supplier['service_name']}")
             rating = self._get_supplier_rating(best_supplier['id'])
             
-            all_ranked = []
-            for supplier in normalized_suppliers:
-                fitness = self._fitness_function([normalized_suppliers.index(supplier)], normalized_suppliers)[0]
-                all_ranked.append({
-                    'id': supplier['id'],
-                    'service_name': supplier['service_name'],
-                    'name': supplier['name'],
-                    'fitness_score': float(fitness),
-                    'metrics': {
-                        'avg_price': float(supplier['avg_price']),
-                        'success_rate': float(supplier['success_rate']),
-                        'avg_delivery_time': float(supplier['avg_delivery_time']),
-                        'denial_rate': float(supplier['denial_rate']),
-                        'orders_count': int(supplier['orders_count']),
-                        'total_revenue': float(supplier['total_revenue'])
+            if all_ranked is None:
+                all_ranked = [
+                    {
+                        'id': normalized_suppliers[idx]['id'],
+                        'service_name': normalized_suppliers[idx]['service_name'],
+                        'name': normalized_suppliers[idx]['name'],
+                        'fitness_score': float(fitness_vector[idx]),
+                        'metrics': self._build_metrics(normalized_suppliers[idx])
                     }
-                })
+                    for idx in self._ranking_order(fitness_vector)
+                ]
+                self._cache_ranking(engine, watermark, normalized_suppliers, all_ranked, best_supplier['id'])
             
-            all_ranked.sort(key=lambda x: x['fitness_score'], reverse=True)
-            
-            filtered_suppliers = [s for s in normalized_suppliers 
-                                 if self._fitness_function([normalized_suppliers.index(s)], normalized_suppliers)[0] >= fitness_threshold]
+            filtered_indices = np.flatnonzero(fitness_vector >= fitness_threshold).tolist()
+            filtered_suppliers = [normalized_suppliers[idx] for idx in filtered_indices]
             
             logger.info(f"GeneticAlgorithmService[find_best_supplier] Filtered {len(filtered_suppliers)} suppliers with fitness >= {fitness_threshold}")
             
+            self._report_progress(progress_callback, 'loading_combinations', 0.1)
+            combinations_by_supplier = self._get_cached_combinations(engine, watermark, [s['id'] for s in filtered_suppliers])
+            uncached_suppliers = [s for s in filtered_suppliers if s['id'] not in combinations_by_supplier]
+            logger.info(f"GeneticAlgorithmService[find_best_supplier] {len(combinations_by_supplier)} supplier combination rankings served from cache, {len(uncached_suppliers)} to compute")
+            article_brand_index = self._get_article_brand_data_bulk([s['service_name'] for s in uncached_suppliers])
+            self._report_progress(progress_callback, 'analyzing_combinations', 0.2)
+            
+            computed_combinations = self._compute_supplier_combinations(
+                uncached_suppliers, 
+                engine, 
+                article_brand_index, 
+                progress_callback
+            )
+            combinations_by_supplier.update(computed_combinations)
+            
             suppliers_with_combinations = []
             all_combinations_global = []
             
-            for supplier in filtered_suppliers:
-                combinations = self._analyze_supplier_combinations(supplier, fitness_threshold)
-                supplier_fitness = self._fitness_function([normalized_suppliers.index(supplier)], normalized_suppliers)[0]
+            for supplier_idx in filtered_indices:
+                supplier = normalized_suppliers[supplier_idx]
+                combinations = combinations_by_supplier[supplier['id']]
                 
                 suppliers_with_combinations.append({
                     'id': supplier['id'],
                     'service_name': supplier['service_name'],
                     'name': supplier['name'],
-                    'fitness_score': float(supplier_fitness),
-                    'metrics': {
-                        'avg_price': float(supplier['avg_price']),
-                        'success_rate': float(supplier['success_rate']),
-                        'avg_delivery_time': float(supplier['avg_delivery_time']),
-                        'denial_rate': float(supplier['denial_rate']),
-                        'orders_count': int(supplier['orders_count']),
-                        'total_revenue': float(supplier['total_revenue'])
-                    },
+                    'fitness_score': float(fitness_vector[supplier_idx]),
+                    'metrics': self._build_metrics(supplier),
                     'article_brand_combinations': combinations
                 })
                 
@@ -672,9 +1048,15 @@ class GeneticAlgorithmService:
                         'metrics': combo['metrics']
                     })
             
+            self._cache_combinations(engine, watermark, computed_combinations)
+            
             all_combinations_global.sort(key=lambda x: x['fitness_score'], reverse=True)
             
-            best_supplier_fitness = self._fitness_function([normalized_suppliers.index(best_supplier)], normalized_suppliers)[0]
+            best_supplier_fitness = fitness_vector[best_supplier_idx]
+            
+            best_supplier_combinations = combinations_by_supplier.get(best_supplier['id'])
+            if best_supplier_combinations is None:
+                best_supplier_combinations = self._analyze_supplier_combinations(best_supplier, fitness_threshold, engine)
             
             execution_time = round(time.time() - start_time, 2)
             
@@ -694,7 +1076,7 @@ class GeneticAlgorithmService:
                         'total_revenue': float(best_supplier['total_revenue'])
                     },
                     'rating': rating,
-                    'article_brand_combinations': self._analyze_supplier_combinations(best_supplier, fitness_threshold)
+                    'article_brand_combinations': best_supplier_combinations
                 },
                 'all_suppliers_ranking': all_ranked,
                 'suppliers_with_combinations': suppliers_with_combinations,
@@ -706,6 +1088,7 @@ class GeneticAlgorithmService:
             
             metadata = {
                 'method': 'genetic_algorithm',
+                'engine': engine,
                 'fitness_threshold': fitness_threshold,
                 'timestamp': datetime.utcnow().isoformat() + 'Z',
                 'execution_time': execution_time,
@@ -713,6 +1096,7 @@ class GeneticAlgorithmService:
                 'filtered_suppliers_count': len(filtered_suppliers)
             }
             
+            self._report_progress(progress_callback, 'saving', 0.9)
             self._save_to_database(result_data, metadata, suppliers_data, history_id)
             
             return result_data
@@ -739,3 +1123,6 @@ class GeneticAlgorithmService:
                 'error': str(e)
             }
 
+def _analyze_supplier_combinations_task(supplier, engine, article_brand_data):
+    service = GeneticAlgorithmService()
+    return supplier['id'], service._analyze_supplier_combinations(supplier, engine=engine, article_brand_data=article_brand_data)
@@ -0,0 +1,127 @@
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY_PREFIX = 'genetic_algorithm:job:'
+ACTIVE_JOBS_KEY = 'genetic_algorithm:jobs:active'
+
+class JobManager:
+    def __init__(self, redis_client, max_workers=1, ttl=86400):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='genetic-algorithm-job')
+    
+    def _job_key(self, job_id):
+        return f'{JOB_KEY_PREFIX}{job_id}'
+    
+    def _publish(self, job_id, **fields):
+        try:
+            key = self._job_key(job_id)
+            self.redis_client.hset(key, mapping={name: json.dumps(value) for name, value in fields.items()})
+            self.redis_client.expire(key, self.ttl)
+        except Exception as e:
+            logger.error(f'JobManager[_publish] job_id={job_id} error: {str(e)}')
+    
+    def submit(self, func, **kwargs):
+        job_id = uuid.uuid4().hex
+        self._publish(
+            job_id,
+            status='queued',
+            stage='queued',
+            progress=0.0,
+            eta_seconds=None,
+            error=None,
+            history_id=kwargs.get('history_id'),
+            created_at=time.time()
+        )
+        self.redis_client.sadd(ACTIVE_JOBS_KEY, job_id)
+        self.executor.submit(self._run, job_id, func, kwargs)
+        logger.info(f'JobManager[submit] Job {job_id} queued')
+        return job_id
+    
+    def _run(self, job_id, func, kwargs):
+        started_at = time.time()
+        self._publish(job_id, status='running', stage='started', started_at=started_at)
+        
+        def report_progress(stage, progress):
+            elapsed = time.time() - started_at
+            eta_seconds = round(elapsed * (1.0 - progress) / progress, 1) if progress > 0 else None
+            self._publish(
+                job_id,
+                stage=stage,
+                progress=round(progress, 4),
+                eta_seconds=eta_seconds,
+                elapsed_seconds=round(elapsed, 1)
+            )
+        
+        try:
+            result = func(progress_callback=report_progress, **kwargs)
+            success = bool(result.get('success', False))
+            if success:
+                self._publish(job_id, progress=1.0)
+            self._publish(
+                job_id,
+                status='completed' if success else 'failed',
+                stage='finished',
+                eta_seconds=0,
+                error=result.get('error'),
+                elapsed_seconds=round(time.time() - started_at, 1),
+                finished_at=time.time()
+            )
+            logger.info(f'JobManager[_run] Job {job_id} finished, success={success}')
+        except Exception as e:
+            logger.error(f'JobManager[_run] Job {job_id} error: {str(e)}')
+            self._publish(
+                job_id,
+                status='failed',
+                stage='finished',
+                eta_seconds=0,
+                error=str(e),
+                elapsed_seconds=round(time.time() - started_at, 1),
+                finished_at=time.time()
+            )
+        finally:
+            self._release(job_id)
+    
+    def _release(self, job_id):
+        try:
+            self.redis_client.srem(ACTIVE_JOBS_KEY, job_id)
+        except Exception as e:
+            logger.error(f'JobManager[_release] job_id={job_id} error: {str(e)}')
+    
+    def fail_orphaned_jobs(self, on_orphan):
+        orphaned = 0
+        for job_id in self.redis_client.smembers(ACTIVE_JOBS_KEY):
+            job_status = self.get_status(job_id) or {}
+            self._publish(
+                job_id,
+                status='failed',
+                stage='finished',
+                eta_seconds=0,
+                error='Job was interrupted by a service restart',
+                finished_at=time.time()
+            )
+            history_id = job_status.get('history_id')
+            if history_id:
+                on_orphan(history_id)
+            self._release(job_id)
+            orphaned += 1
+        
+        if orphaned:
+            logger.warning(f'JobManager[fail_orphaned_jobs] Marked {orphaned} interrupted jobs as failed')
+        return orphaned
+    
+    def get_status(self, job_id):
+        fields = self.redis_client.hgetall(self._job_key(job_id))
+        if not fields:
+            return None
+        job_status = {name: json.loads(value) for name, value in fields.items()}
+        job_status['job_id'] = job_id
+        return job_status
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
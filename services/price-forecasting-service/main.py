@@ -2,20 +2,14 @@ import os
 import sys
 import logging
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-try:
-    import cmdstanpy
-    cmdstan_path = cmdstanpy.utils.cmdstan_path()
-    os.environ['CMDSTAN'] = str(cmdstan_path)
-    cmdstanpy.set_cmdstan_path(cmdstan_path)
-except:
-    pass
-
 from services.price_forecasting_logic import PriceForecastingService
+from services.prophet_engine import init_prophet_engine, get_prophet_engine_status
 from services.database import init_db_pool, close_db_pool
 from services.connections import init_redis_connection, close_redis_connection, get_redis_client
 
@@ -46,10 +40,38 @@ async def lifespan(app: FastAPI):
         logger.error(f"Main[lifespan] Failed to initialize database pool: {str(e)}")
         raise
     
+    await run_in_threadpool(init_prophet_engine)
+    
     try:
         redis_client = get_redis_client()
-        forecasting_service = PriceForecastingService(redis_client)
-        logger.info("Main[lifespan] PriceForecastingService initialized")
+        workers = int(os.getenv('PRICE_FORECASTING_WORKERS', str(os.cpu_count() or 1)))
+        corrector_mode = os.getenv('PRICE_FORECASTING_CORRECTOR_MODE', 'global')
+        model_cache_ttl = int(os.getenv('PRICE_FORECASTING_MODEL_CACHE_TTL', '604800'))
+        model_dir = os.getenv('PRICE_FORECASTING_MODEL_DIR') or None
+        incremental = os.getenv('PRICE_FORECASTING_INCREMENTAL', '0') == '1'
+        engine = os.getenv('PRICE_FORECASTING_ENGINE', 'prophet')
+        prophet_top_n = int(os.getenv('PRICE_FORECASTING_PROPHET_TOP_N', '100'))
+        corrector_path = os.getenv('PRICE_FORECASTING_CORRECTOR_PATH', 'models/global_corrector.json')
+        corrector_threads = int(os.getenv('PRICE_FORECASTING_CORRECTOR_THREADS', str(os.cpu_count() or 1)))
+        forecast_cache_ttl = int(os.getenv('PRICE_FORECASTING_RESULT_CACHE_TTL', '86400'))
+        on_demand_workers = int(os.getenv('PRICE_FORECASTING_ON_DEMAND_WORKERS', '2'))
+        save_batch_size = int(os.getenv('PRICE_FORECASTING_SAVE_BATCH_SIZE', '1000'))
+        forecasting_service = PriceForecastingService(
+            redis_client,
+            workers=workers,
+            corrector_mode=corrector_mode,
+            model_cache_ttl=model_cache_ttl,
+            model_dir=model_dir,
+            incremental=incremental,
+            engine=engine,
+            prophet_top_n=prophet_top_n,
+            corrector_path=corrector_path,
+            corrector_threads=corrector_threads,
+            forecast_cache_ttl=forecast_cache_ttl,
+            on_demand_workers=on_demand_workers,
+            save_batch_size=save_batch_size
+        )
+        logger.info(f"Main[lifespan] PriceForecastingService initialized with {workers} workers")
     except Exception as e:
         logger.error(f"Main[lifespan] Failed to initialize PriceForecastingService: {str(e)}")
         raise
@@ -114,14 +136,29 @@ async def health():
     return {
         "status": status,
         "redis": redis_status,
-        "database": db_status
+        "database": db_status,
+        "prophet_engine": get_prophet_engine_status()
     }
 
 @app.get("/forecast")
-async def forecast_prices(history_id: int = None, forecast_days: int = 30):
+async def forecast_prices(history_id: int = None, forecast_days: int = 30, incremental: bool = None, engine: str = None):
+    if not forecasting_service:
+        return {"error": "Forecasting service not initialized"}
+    result = await run_in_threadpool(forecasting_service.forecast_prices, history_id, forecast_days, incremental, engine)
+    return result
+
+@app.get("/forecast/backtest")
+async def backtest_corrector(article: str, brand: str, holdout_days: int = 30):
+    if not forecasting_service:
+        return {"error": "Forecasting service not initialized"}
+    result = await run_in_threadpool(forecasting_service.backtest_corrector, article, brand, holdout_days)
+    return result
+
+@app.get("/forecast/{article}/{brand}")
+async def get_forecast(article: str, brand: str, forecast_days: int = 30):
     if not forecasting_service:
         return {"error": "Forecasting service not initialized"}
-    result = forecasting_service.forecast_prices(history_id, forecast_days)
+    result = await run_in_threadpool(forecasting_service.get_forecast, article, brand, forecast_days)
     return result
 
 if __name__ == "__main__":
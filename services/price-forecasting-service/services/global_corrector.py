@@ -0,0 +1,101 @@
+import os
+import logging
+import threading
+import time
+import numpy as np
+import xgboost as xgb
+
+logger = logging.getLogger(__name__)
+
+RATIO_BOUNDS = (0.5, 2.0)
+FEATURE_VERSION = '2'
+
+class GlobalCorrector:
+    def __init__(self, path, threads=-1, min_rows=5000):
+        self.path = path
+        self.threads = threads
+        self.min_rows = min_rows
+        self.model = None
+        self._lock = threading.Lock()
+        self._rejected_mtime = None
+    
+    @staticmethod
+    def transform(features, descriptors):
+        yhat = features[:, 0]
+        rolling_mean = features[:, 9]
+        safe_yhat = np.where(np.abs(yhat) > 1e-9, yhat, np.nan)
+        safe_mean = np.where(np.abs(rolling_mean) > 1e-9, rolling_mean, np.nan)
+        
+        return np.column_stack([
+            features[:, 1] / safe_yhat,
+            features[:, 2:9],
+            rolling_mean / safe_yhat,
+            features[:, 10] / safe_mean,
+            features[:, 11:13],
+            np.broadcast_to(descriptors, (len(features), len(descriptors)))
+        ]).astype(np.float32)
+    
+    def is_ready(self):
+        with self._lock:
+            if self.model is not None:
+                return True
+        return self.load()
+    
+    def fit(self, X, y):
+        start_time = time.time()
+        params = {
+            'objective': 'reg:squarederror',
+            'tree_method': 'hist',
+            'max_depth': 6,
+            'eta': 0.1,
+            'subsample': 0.8,
+            'colsample_bytree': 0.8,
+            'seed': 42,
+            'nthread': self.threads
+        }
+        model = xgb.train(params, xgb.DMatrix(X, label=y, nthread=self.threads), num_boost_round=300)
+        model.set_attr(feature_version=FEATURE_VERSION)
+        with self._lock:
+            self.model = model
+        logger.info(f"GlobalCorrector[fit] Trained on {len(X)} rows in {round(time.time() - start_time, 2)}s")
+        self.save(model)
+    
+    def save(self, model):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            root, extension = os.path.splitext(self.path)
+            temp_path = f"{root}.tmp{extension}"
+            model.save_model(temp_path)
+            os.replace(temp_path, self.path)
+            logger.info(f"GlobalCorrector[save] Model saved to {self.path}")
+        except Exception as e:
+            logger.error(f"GlobalCorrector[save] Error: {str(e)}")
+    
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self._rejected_mtime:
+                return False
+            
+            model = xgb.Booster(params={'nthread': self.threads})
+            model.load_model(self.path)
+            if model.attr('feature_version') != FEATURE_VERSION:
+                self._rejected_mtime = mtime
+                logger.warning(f"GlobalCorrector[load] Ignoring {self.path}: feature version {model.attr('feature_version')}, expected {FEATURE_VERSION}")
+                return False
+            with self._lock:
+                if self.model is None:
+                    self.model = model
+            logger.info(f"GlobalCorrector[load] Model loaded from {self.path}")
+            return True
+        except Exception as e:
+            logger.error(f"GlobalCorrector[load] Error: {str(e)}")
+            return False
+    
+    def predict_ratio(self, X):
+        with self._lock:
+            model = self.model
+        return np.clip(model.predict(xgb.DMatrix(X, nthread=self.threads)), *RATIO_BOUNDS)
@@ -0,0 +1,107 @@
+import logging
+import time
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DAY = np.timedelta64(1, 'D')
+
+class LinearForecaster:
+    def __init__(self, changepoints=10, yearly_order=6, weekly_order=3, ridge=1.0, interval_width=0.8, batch_size=1000):
+        self.changepoints = changepoints
+        self.yearly_order = yearly_order
+        self.weekly_order = weekly_order
+        self.ridge = ridge
+        self.z_score = NormalDist().inv_cdf(0.5 + interval_width / 2)
+        self.batch_size = batch_size
+    
+    def _design_matrix(self, origin, total_days, history_days):
+        day_index = np.arange(total_days, dtype=float)
+        absolute_day = day_index + (origin - np.datetime64('1970-01-01', 'D')) / DAY
+        t = day_index / max(history_days - 1, 1)
+        knots = np.arange(1, self.changepoints + 1) / (self.changepoints + 1)
+        
+        columns = [np.ones(total_days), t, np.maximum(0.0, t[:, None] - knots[None, :])]
+        for period, order in ((365.25, self.yearly_order), (7.0, self.weekly_order)):
+            angles = 2 * np.pi * absolute_day[:, None] * np.arange(1, order + 1)[None, :] / period
+            columns.extend([np.sin(angles), np.cos(angles)])
+        
+        return np.column_stack(columns)
+    
+    def _penalty(self, n_features):
+        penalty = np.full(n_features, self.ridge)
+        penalty[:2] = 1e-6
+        return np.diag(penalty)
+    
+    def _fit_chunk(self, X_history, X_full, penalty, values, observed, first, last, forecast_days):
+        weights = observed.astype(float)
+        scale = np.nanmax(np.abs(values), axis=1)
+        scale[~(scale > 0)] = 1.0
+        scaled = np.nan_to_num(values / scale[:, None])
+        
+        n_features = X_history.shape[1]
+        outer = (X_history[:, :, None] * X_history[:, None, :]).reshape(len(X_history), -1)
+        A = (weights @ outer).reshape(-1, n_features, n_features) + penalty
+        b = (weights * scaled) @ X_history
+        beta = np.linalg.solve(A, b[:, :, None])[:, :, 0]
+        
+        fitted = beta @ X_history.T
+        residual_dof = np.maximum(weights.sum(axis=1) - n_features, 1.0)
+        sigma = np.sqrt((weights * (scaled - fitted) ** 2).sum(axis=1) / residual_dof)
+        
+        future_index = last[:, None] + 1 + np.arange(forecast_days)[None, :]
+        future = np.einsum('shk,sk->sh', X_full[future_index], beta)
+        margin = (self.z_score * sigma)[:, None]
+        
+        return {
+            'fitted': fitted * scale[:, None],
+            'yhat': future * scale[:, None],
+            'yhat_lower': (future - margin) * scale[:, None],
+            'yhat_upper': (future + margin) * scale[:, None],
+            'future_index': future_index
+        }
+    
+    def fit_predict(self, series, forecast_days):
+        if not series:
+            return []
+        
+        start_time = time.time()
+        day_series = [dates.astype('datetime64[D]') for dates, _ in series]
+        origin = min(dates[0] for dates in day_series)
+        history_days = int((max(dates[-1] for dates in day_series) - origin) / DAY) + 1
+        X_full = self._design_matrix(origin, history_days + forecast_days, history_days)
+        X_history = X_full[:history_days]
+        penalty = self._penalty(X_full.shape[1])
+        
+        results = []
+        for chunk_start in range(0, len(series), self.batch_size):
+            chunk = range(chunk_start, min(chunk_start + self.batch_size, len(series)))
+            values = np.full((len(chunk), history_days), np.nan)
+            first = np.empty(len(chunk), dtype=np.int64)
+            last = np.empty(len(chunk), dtype=np.int64)
+            
+            for row, position in enumerate(chunk):
+                offsets = ((day_series[position] - origin) / DAY).astype(np.int64)
+                values[row, offsets] = series[position][1]
+                first[row] = offsets.min()
+                last[row] = offsets.max()
+            
+            values = pd.DataFrame(values).interpolate(axis=1, limit_area='inside').to_numpy()
+            observed = ~np.isnan(values)
+            fit = self._fit_chunk(X_history, X_full, penalty, values, observed, first, last, forecast_days)
+            
+            for row in range(len(chunk)):
+                span = slice(first[row], last[row] + 1)
+                results.append({
+                    'history': values[row, span],
+                    'history_fitted': fit['fitted'][row, span],
+                    'dates': origin + fit['future_index'][row] * DAY,
+                    'yhat': fit['yhat'][row],
+                    'yhat_lower': fit['yhat_lower'][row],
+                    'yhat_upper': fit['yhat_upper'][row]
+                })
+        
+        logger.info(f"LinearForecaster[fit_predict] Forecasted {len(series)} series over {history_days} days in {round(time.time() - start_time, 2)}s")
+        return results
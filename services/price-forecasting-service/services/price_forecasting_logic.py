@@ -1,46 +1,66 @@
+import os
 import logging
 import json
 import time
+import hashlib
 import traceback
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
 import numpy as np
 import pandas as pd
 from prophet import Prophet
+from prophet.serialize import model_to_json, model_from_json
+from psycopg2.extras import execute_values
 import xgboost as xgb
 from .database import get_db_cursor
-from .connections import get_redis_client
+from .connections import get_redis_client, init_redis_connection
+from .time_series_store import load_daily_series
+from .linear_forecaster import LinearForecaster
+from .global_corrector import GlobalCorrector
+from .prophet_engine import init_prophet_engine
 
 logger = logging.getLogger(__name__)
 
+ENGINES = ('prophet', 'linear')
+SERIES_CORRECTOR_MODES = ('in_sample', 'rolling')
+CORRECTOR_MODES = ('global',) + SERIES_CORRECTOR_MODES
+CORRECTOR_WINDOW = 30
+GLOBAL_CORRECTOR_ROWS_PER_SERIES = 120
+MODEL_CACHE_PREFIX = 'price_forecast_model'
+MODEL_CACHE_VERSION = 1
+FORECAST_CACHE_PREFIX = 'price_forecast'
+SEASONALITY_CACHE_PREFIX = 'seasonality'
+SEASONALITY_CACHE_TTL = 86400
+SEASONALITY_PRELOAD_CHUNK = 5000
+LOCAL_FORECAST_CACHE_SIZE = 10000
+LOCAL_FORECAST_CACHE_TTL = 300
+
+_worker_service = None
+
 class PriceForecastingService:
-    def __init__(self, redis_client=None):
+    def __init__(self, redis_client=None, workers=1, corrector_mode='global', model_cache_ttl=604800, model_dir=None, incremental=False, engine='prophet', prophet_top_n=100, corrector_path='models/global_corrector.json', corrector_threads=-1, forecast_cache_ttl=86400, on_demand_workers=2, save_batch_size=1000):
         self.redis_client = redis_client
-    
-    def _get_article_brand_combinations(self):
-        query = """
-            SELECT 
-                order_product.article,
-                order_product.brand,
-                COUNT(order_product.id) as orders_count
-            FROM order_product
-            WHERE order_product.is_denied = 0 
-              AND order_product.is_archived = 0
-            GROUP BY order_product.article, order_product.brand
-            HAVING COUNT(order_product.id) >= 300
-            ORDER BY COUNT(order_product.id) DESC
-        """
-        
-        with get_db_cursor() as cursor:
-            cursor.execute(query)
-            columns = [desc[0] for desc in cursor.description]
-            rows = cursor.fetchall()
-        
-        combinations = []
-        for row in rows:
-            combination = dict(zip(columns, row))
-            combinations.append(combination)
-        
-        return combinations
+        self.incremental = incremental
+        self.engine = engine if engine in ENGINES else 'prophet'
+        self.prophet_top_n = max(0, prophet_top_n)
+        self.workers = max(1, workers)
+        self.model_cache_ttl = model_cache_ttl
+        self.model_dir = model_dir
+        if corrector_mode not in CORRECTOR_MODES:
+            logger.warning(f"PriceForecastingService[__init__] Unknown corrector mode '{corrector_mode}', falling back to 'global'")
+            corrector_mode = 'global'
+        self.corrector_mode = corrector_mode
+        self.global_corrector = GlobalCorrector(corrector_path, corrector_threads)
+        self.forecast_cache_ttl = forecast_cache_ttl
+        self.save_batch_size = max(1, save_batch_size)
+        self._local_forecasts = OrderedDict()
+        self._local_forecasts_lock = threading.Lock()
+        self._inflight_forecasts = {}
+        self._inflight_lock = threading.Lock()
+        self._on_demand_slots = threading.BoundedSemaphore(max(1, on_demand_workers))
     
     def _get_time_series_data(self, article, brand):
         query = """
@@ -97,8 +117,31 @@ class PriceForecastingService:
         
         return df_reindexed
     
+    def _seasonality_cache_key(self, article, brand):
+        return f"{SEASONALITY_CACHE_PREFIX}:{article}:{brand}"
+    
+    def _json_column(self, value):
+        if not value:
+            return None
+        return json.loads(value) if isinstance(value, str) else value
+    
+    def _seasonality_from_row(self, article, brand, row):
+        monthly_coeffs = self._json_column(row[0]) or {}
+        monthly_coeffs_str = {str(k): v for k, v in monthly_coeffs.items()}
+        
+        return {
+            'success': True,
+            'article': article,
+            'brand': brand,
+            'monthly_coefficients': monthly_coeffs_str,
+            'quarterly_coefficients': self._json_column(row[1]),
+            'weekly_coefficients': self._json_column(row[2]),
+            'trend': self._json_column(row[3]),
+            'anomalies': self._json_column(row[4])
+        }
+    
     def _get_seasonality_data(self, article, brand):
-        cache_key = f"seasonality:{article}:{brand}"
+        cache_key = self._seasonality_cache_key(article, brand)
         
         if self.redis_client:
             cached = self.redis_client.get(cache_key)
@@ -128,22 +171,10 @@ class PriceForecastingService:
                 row = cursor.fetchone()
                 
                 if row:
-                    monthly_coeffs = json.loads(row[0]) if row[0] else {}
-                    monthly_coeffs_str = {str(k): v for k, v in monthly_coeffs.items()}
-                    
-                    data = {
-                        'success': True,
-                        'article': article,
-                        'brand': brand,
-                        'monthly_coefficients': monthly_coeffs_str,
-                        'quarterly_coefficients': json.loads(row[1]) if row[1] else None,
-                        'weekly_coefficients': json.loads(row[2]) if row[2] else None,
-                        'trend': json.loads(row[3]) if row[3] else None,
-                        'anomalies': json.loads(row[4]) if row[4] else None
-                    }
+                    data = self._seasonality_from_row(article, brand, row)
                     
                     if self.redis_client:
-                        self.redis_client.setex(cache_key, 86400, json.dumps(data))
+                        self.redis_client.setex(cache_key, SEASONALITY_CACHE_TTL, json.dumps(data))
                     
                     return data
         except Exception as e:
@@ -151,7 +182,180 @@ class PriceForecastingService:
         
         return None
     
-    def _build_prophet_model(self, time_series_data):
+    def _get_cached_seasonality(self, keys):
+        found = {}
+        if not self.redis_client:
+            return found
+        
+        for start in range(0, len(keys), SEASONALITY_PRELOAD_CHUNK):
+            chunk = keys[start:start + SEASONALITY_PRELOAD_CHUNK]
+            try:
+                values = self.redis_client.mget([self._seasonality_cache_key(article, brand) for article, brand in chunk])
+            except Exception as e:
+                logger.error(f"PriceForecastingService[_get_cached_seasonality] Error: {str(e)}")
+                continue
+            
+            for key, value in zip(chunk, values):
+                if not value:
+                    continue
+                try:
+                    found[key] = json.loads(value)
+                except Exception as e:
+                    logger.error(f"PriceForecastingService[_get_cached_seasonality] Error parsing {key[0]}/{key[1]}: {str(e)}")
+        
+        return found
+    
+    def _get_stored_seasonality(self, keys):
+        query = """
+            SELECT DISTINCT ON (sar.article, sar.brand)
+                sar.article,
+                sar.brand,
+                sar.monthly_coefficients,
+                sar.quarterly_coefficients,
+                sar.weekly_coefficients,
+                sar.trend,
+                sar.anomalies
+            FROM seasonality_analysis_results sar
+            INNER JOIN analysis_history ah ON sar.history_id = ah.id
+            INNER JOIN unnest(%s::text[], %s::text[]) AS requested(article, brand)
+                ON requested.article = sar.article AND requested.brand = sar.brand
+            WHERE ah.name = 'SEASONALITY_ANALYSIS'
+              AND ah.status = 'SUCCESS'
+            ORDER BY sar.article, sar.brand, sar.created_at DESC
+        """
+        
+        found = {}
+        try:
+            with get_db_cursor() as cursor:
+                cursor.execute(query, ([key[0] for key in keys], [key[1] for key in keys]))
+                rows = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"PriceForecastingService[_get_stored_seasonality] Error: {str(e)}")
+            return found
+        
+        for row in rows:
+            try:
+                found[(row[0], row[1])] = self._seasonality_from_row(row[0], row[1], row[2:])
+            except Exception as e:
+                logger.error(f"PriceForecastingService[_get_stored_seasonality] Error parsing {row[0]}/{row[1]}: {str(e)}")
+        
+        return found
+    
+    def _cache_seasonality(self, seasonality):
+        if not self.redis_client or not seasonality:
+            return
+        
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for (article, brand), data in seasonality.items():
+                pipeline.setex(self._seasonality_cache_key(article, brand), SEASONALITY_CACHE_TTL, json.dumps(data))
+            pipeline.execute()
+        except Exception as e:
+            logger.error(f"PriceForecastingService[_cache_seasonality] Error: {str(e)}")
+    
+    def _preload_seasonality(self, combinations):
+        start_time = time.time()
+        keys = [(combination['article'], combination['brand']) for combination in combinations]
+        
+        seasonality = self._get_cached_seasonality(keys)
+        missing = [key for key in keys if key not in seasonality]
+        stored = self._get_stored_seasonality(missing) if missing else {}
+        self._cache_seasonality(stored)
+        seasonality.update(stored)
+        
+        logger.info(f"PriceForecastingService[_preload_seasonality] Loaded seasonality for {len(seasonality)}/{len(keys)} combinations ({len(keys) - len(missing)} from Redis, {len(stored)} from database) in {round(time.time() - start_time, 2)}s")
+        return {key: seasonality.get(key, {}) for key in keys}
+    
+    def _series_hash(self, df):
+        digest = hashlib.sha1(f'v{MODEL_CACHE_VERSION}:{len(df)}'.encode())
+        digest.update(pd.DatetimeIndex(df['ds']).asi8.tobytes())
+        digest.update(df['y'].to_numpy(dtype=float).tobytes())
+        return digest.hexdigest()
+    
+    def _model_cache_key(self, article, brand):
+        return f"{MODEL_CACHE_PREFIX}:{article}:{brand}"
+    
+    def _get_cached_model(self, article, brand):
+        if not self.redis_client or not self.model_cache_ttl:
+            return None
+        
+        try:
+            cached = self.redis_client.get(self._model_cache_key(article, brand))
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.error(f"PriceForecastingService[_get_cached_model] Error reading model cache for {article}/{brand}: {str(e)}")
+            return None
+    
+    def _cache_model(self, article, brand, series_hash, model):
+        if not self.redis_client or not self.model_cache_ttl:
+            return
+        
+        try:
+            entry = {
+                'series_hash': series_hash,
+                'params': self._warm_start_params(model)
+            }
+            self.redis_client.setex(self._model_cache_key(article, brand), self.model_cache_ttl, json.dumps(entry))
+        except Exception as e:
+            logger.error(f"PriceForecastingService[_cache_model] Error caching model for {article}/{brand}: {str(e)}")
+    
+    def _model_path(self, article, brand):
+        return os.path.join(self.model_dir, f"{hashlib.sha1(f'{article}:{brand}'.encode()).hexdigest()}.json")
+    
+    def _load_model_file(self, article, brand, series_hash):
+        if not self.model_dir:
+            return None
+        
+        path = self._model_path(article, brand)
+        if not os.path.exists(path):
+            return None
+        
+        try:
+            with open(path) as model_file:
+                entry = json.load(model_file)
+            if entry.get('series_hash') != series_hash:
+                return None
+            return model_from_json(entry['model'])
+        except Exception as e:
+            logger.error(f"PriceForecastingService[_load_model_file] Error reading model file for {article}/{brand}: {str(e)}")
+            return None
+    
+    def _save_model_file(self, article, brand, series_hash, model):
+        if not self.model_dir:
+            return
+        
+        try:
+            os.makedirs(self.model_dir, exist_ok=True)
+            path = self._model_path(article, brand)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as model_file:
+                json.dump({'series_hash': series_hash, 'model': model_to_json(model)}, model_file)
+            os.replace(temp_path, path)
+        except Exception as e:
+            logger.error(f"PriceForecastingService[_save_model_file] Error writing model file for {article}/{brand}: {str(e)}")
+    
+    def _warm_start_params(self, model):
+        params = {}
+        for name in ['k', 'm', 'sigma_obs']:
+            params[name] = float(model.params[name][0][0])
+        for name in ['delta', 'beta']:
+            params[name] = model.params[name][0].tolist()
+        return params
+    
+    def _create_prophet_model(self):
+        return Prophet(
+            yearly_seasonality=True,
+            weekly_seasonality=True,
+            daily_seasonality=False,
+            seasonality_mode='multiplicative',
+            changepoint_prior_scale=0.05,
+            seasonality_prior_scale=10.0,
+            stan_backend='CMDSTANPY',
+            mcmc_samples=0,
+            interval_width=0.8
+        )
+    
+    def _build_prophet_model(self, time_series_data, article=None, brand=None):
         df = time_series_data.copy()
         df = df.reset_index()
         
@@ -170,43 +374,40 @@ class PriceForecastingService:
         df = df[[date_col, 'avg_price']].copy()
         df.columns = ['ds', 'y']
         
+        init_prophet_engine(warmup=False)
+        
         try:
-            import prophet
-            import cmdstanpy
-            logger.info(f"PriceForecastingService[_build_prophet_model] Prophet version: {prophet.__version__}")
-            logger.info(f"PriceForecastingService[_build_prophet_model] DataFrame shape: {df.shape}, columns: {df.columns.tolist()}")
-            logger.info(f"PriceForecastingService[_build_prophet_model] Data range: {df['ds'].min()} to {df['ds'].max()}")
-            logger.info(f"PriceForecastingService[_build_prophet_model] Price range: {df['y'].min()} to {df['y'].max()}")
+            logger.info(f"PriceForecastingService[_build_prophet_model] DataFrame shape: {df.shape}, data range: {df['ds'].min()} to {df['ds'].max()}, price range: {df['y'].min()} to {df['y'].max()}")
             
-            try:
-                cmdstan_path = cmdstanpy.utils.cmdstan_path()
-                logger.info(f"PriceForecastingService[_build_prophet_model] Using CmdStan path: {cmdstan_path}")
-                import os
-                os.environ['CMDSTAN'] = str(cmdstan_path)
-                cmdstanpy.set_cmdstan_path(cmdstan_path)
-                
-                import prophet.models as pm
-                import pathlib
-                local_cmdstan = pathlib.Path(pm.__file__).parent / 'stan_model' / 'cmdstan-2.33.1'
-                if not local_cmdstan.exists() or not (local_cmdstan / 'makefile').exists():
-                    logger.info(f"PriceForecastingService[_build_prophet_model] Bundled CmdStan invalid, using installed: {cmdstan_path}")
-            except Exception as e:
-                logger.warning(f"PriceForecastingService[_build_prophet_model] Could not set CmdStan path: {str(e)}")
-            
-            model = Prophet(
-                yearly_seasonality=True,
-                weekly_seasonality=True,
-                daily_seasonality=False,
-                seasonality_mode='multiplicative',
-                changepoint_prior_scale=0.05,
-                seasonality_prior_scale=10.0,
-                stan_backend='CMDSTANPY',
-                mcmc_samples=0,
-                interval_width=0.8
-            )
-            logger.info(f"PriceForecastingService[_build_prophet_model] Prophet model created, starting fit...")
-            model.fit(df)
+            series_hash = None
+            cached = None
+            if article is not None:
+                series_hash = self._series_hash(df)
+                cached = self._get_cached_model(article, brand)
+            
+            if cached and cached.get('series_hash') == series_hash:
+                model = self._load_model_file(article, brand, series_hash)
+                if model is not None:
+                    logger.info(f"PriceForecastingService[_build_prophet_model] Series unchanged for {article}/{brand}, reusing stored model")
+                    return model, df
+            
+            model = self._create_prophet_model()
+            if cached and cached.get('params'):
+                logger.info(f"PriceForecastingService[_build_prophet_model] Prophet model created, warm-starting fit from cached parameters...")
+                try:
+                    model.fit(df, init=cached['params'])
+                except Exception as e:
+                    logger.warning(f"PriceForecastingService[_build_prophet_model] Warm start failed for {article}/{brand}, refitting from scratch: {str(e)}")
+                    model = self._create_prophet_model()
+                    model.fit(df)
+            else:
+                logger.info(f"PriceForecastingService[_build_prophet_model] Prophet model created, starting fit...")
+                model.fit(df)
             logger.info(f"PriceForecastingService[_build_prophet_model] Prophet model fitted successfully")
+            
+            if series_hash:
+                self._cache_model(article, brand, series_hash, model)
+                self._save_model_file(article, brand, series_hash, model)
             return model, df
         except ImportError as e:
             logger.error(f"PriceForecastingService[_build_prophet_model] Import error: {str(e)}")
@@ -224,46 +425,60 @@ class PriceForecastingService:
             return None, None
     
     def _prepare_xgboost_features(self, time_series_data, prophet_forecast, seasonal_data):
-        features = []
-        
-        for idx, row in prophet_forecast.iterrows():
-            date = row['ds']
-            
-            month_coeff = 1.0
-            if seasonal_data and 'monthly_coefficients' in seasonal_data:
-                month_coeff = seasonal_data['monthly_coefficients'].get(str(date.month), 1.0)
-            
-            trend_value = row.get('trend', row['yhat'])
-            
-            recent_prices = time_series_data['avg_price'].iloc[-30:] if len(time_series_data) >= 30 else time_series_data['avg_price']
-            recent_orders = time_series_data['orders_count'].iloc[-30:] if len(time_series_data) >= 30 else time_series_data['orders_count']
-            
-            feature_vector = [
-                row['yhat'],
-                trend_value,
-                row.get('yearly', 1.0),
-                row.get('weekly', 1.0),
-                date.month,
-                date.quarter,
-                date.dayofweek,
-                date.dayofyear,
-                month_coeff,
-                recent_prices.mean() if len(recent_prices) > 0 else 0.0,
-                recent_prices.std() if len(recent_prices) > 0 else 0.0,
-                recent_orders.mean() if len(recent_orders) > 0 else 0.0,
-                (recent_prices.iloc[-1] - recent_prices.iloc[0]) / recent_prices.iloc[0] if len(recent_prices) > 1 else 0.0
-            ]
-            
-            features.append(feature_vector)
-        
-        return np.array(features)
-    
-    def _train_xgboost_corrector(self, time_series_data, seasonal_data):
-        if len(time_series_data) < 30:
-            return None
+        horizon = len(prophet_forecast)
+        dates = pd.DatetimeIndex(prophet_forecast['ds'])
+        
+        month_lookup = np.ones(13)
+        if seasonal_data and 'monthly_coefficients' in seasonal_data:
+            monthly_coefficients = seasonal_data['monthly_coefficients']
+            month_lookup = np.array([monthly_coefficients.get(str(month), 1.0) for month in range(13)], dtype=float)
         
+        yhat = prophet_forecast['yhat'].to_numpy(dtype=float)
+        trend = prophet_forecast['trend'].to_numpy(dtype=float) if 'trend' in prophet_forecast else yhat
+        yearly = prophet_forecast['yearly'].to_numpy(dtype=float) if 'yearly' in prophet_forecast else np.ones(horizon)
+        weekly = prophet_forecast['weekly'].to_numpy(dtype=float) if 'weekly' in prophet_forecast else np.ones(horizon)
+        
+        recent_prices = time_series_data['avg_price'].iloc[-CORRECTOR_WINDOW:]
+        recent_orders = time_series_data['orders_count'].iloc[-CORRECTOR_WINDOW:]
+        recent_stats = [
+            recent_prices.mean() if len(recent_prices) > 0 else 0.0,
+            recent_prices.std() if len(recent_prices) > 0 else 0.0,
+            recent_orders.mean() if len(recent_orders) > 0 else 0.0,
+            (recent_prices.iloc[-1] - recent_prices.iloc[0]) / recent_prices.iloc[0] if len(recent_prices) > 1 else 0.0
+        ]
+        
+        return np.column_stack([
+            yhat,
+            trend,
+            yearly,
+            weekly,
+            dates.month,
+            dates.quarter,
+            dates.dayofweek,
+            dates.dayofyear,
+            month_lookup[dates.month],
+            np.broadcast_to(np.array(recent_stats, dtype=float), (horizon, len(recent_stats)))
+        ])
+    
+    def _build_forecast_data(self, dates, prices, confidence_lower, confidence_upper):
+        return [
+            {
+                'date': date,
+                'price': price,
+                'confidence_lower': lower,
+                'confidence_upper': upper
+            }
+            for date, price, lower, upper in zip(
+                pd.DatetimeIndex(dates).strftime('%Y-%m-%d'),
+                np.asarray(prices, dtype=float).tolist(),
+                np.asarray(confidence_lower, dtype=float).tolist(),
+                np.asarray(confidence_upper, dtype=float).tolist()
+            )
+        ]
+    
+    def _build_rolling_features(self, time_series_data, seasonal_data):
         total_windows = len(time_series_data) - 30
-        logger.info(f"PriceForecastingService[_train_xgboost_corrector] Training XGBoost corrector with {total_windows} windows")
+        logger.info(f"PriceForecastingService[_build_rolling_features] Training XGBoost corrector with {total_windows} windows")
         
         historical_features = []
         historical_targets = []
@@ -273,11 +488,11 @@ class PriceForecastingService:
         if len(sampled_indices) > 100:
             sampled_indices = sampled_indices[:100]
         
-        logger.info(f"PriceForecastingService[_train_xgboost_corrector] Using {len(sampled_indices)} windows instead of {total_windows} for faster training")
+        logger.info(f"PriceForecastingService[_build_rolling_features] Using {len(sampled_indices)} windows instead of {total_windows} for faster training")
         
         for idx, i in enumerate(sampled_indices):
             if idx % 20 == 0:
-                logger.info(f"PriceForecastingService[_train_xgboost_corrector] Processing window {idx + 1}/{len(sampled_indices)}")
+                logger.info(f"PriceForecastingService[_build_rolling_features] Processing window {idx + 1}/{len(sampled_indices)}")
             window_data = time_series_data.iloc[i-30:i]
             current_date = time_series_data.index[i]
             actual_price = time_series_data.iloc[i]['avg_price']
@@ -327,11 +542,67 @@ class PriceForecastingService:
             except Exception as e:
                 continue
         
-        if len(historical_features) < 10:
+        return np.array(historical_features), np.array(historical_targets)
+    
+    def _build_in_sample_features(self, time_series_data, prophet_forecast, seasonal_data):
+        n = len(time_series_data)
+        history = prophet_forecast.iloc[:n].reset_index(drop=True)
+        dates = pd.DatetimeIndex(history['ds'])
+        
+        prices = pd.Series(time_series_data['avg_price'].to_numpy(dtype=float))
+        orders = pd.Series(time_series_data['orders_count'].to_numpy(dtype=float))
+        
+        rolling_mean = prices.rolling(CORRECTOR_WINDOW).mean().shift(1)
+        rolling_std = prices.rolling(CORRECTOR_WINDOW).std().shift(1)
+        orders_mean = orders.rolling(CORRECTOR_WINDOW).mean().shift(1)
+        window_first = prices.shift(CORRECTOR_WINDOW)
+        window_last = prices.shift(1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            momentum = ((window_last - window_first) / window_first).replace([np.inf, -np.inf], 0.0)
+        
+        month_lookup = np.ones(13)
+        if seasonal_data and 'monthly_coefficients' in seasonal_data:
+            monthly_coefficients = seasonal_data['monthly_coefficients']
+            month_lookup = np.array([monthly_coefficients.get(str(month), 1.0) for month in range(13)], dtype=float)
+        
+        yhat = history['yhat'].to_numpy(dtype=float)
+        trend = history['trend'].to_numpy(dtype=float) if 'trend' in history else yhat
+        yearly = history['yearly'].to_numpy(dtype=float) if 'yearly' in history else np.ones(n)
+        weekly = history['weekly'].to_numpy(dtype=float) if 'weekly' in history else np.ones(n)
+        
+        X = np.column_stack([
+            yhat,
+            trend,
+            yearly,
+            weekly,
+            dates.month,
+            dates.quarter,
+            dates.dayofweek,
+            dates.dayofyear,
+            month_lookup[dates.month],
+            rolling_mean.to_numpy(),
+            rolling_std.to_numpy(),
+            orders_mean.to_numpy(),
+            momentum.to_numpy()
+        ])[CORRECTOR_WINDOW:]
+        y = prices.to_numpy()[CORRECTOR_WINDOW:]
+        
+        valid = ~np.isnan(X).any(axis=1)
+        return X[valid], y[valid]
+    
+    def _train_xgboost_corrector(self, time_series_data, seasonal_data, prophet_forecast=None, mode=None):
+        if len(time_series_data) < CORRECTOR_WINDOW:
             return None
         
-        X = np.array(historical_features)
-        y = np.array(historical_targets)
+        mode = mode or self.corrector_mode
+        if mode == 'in_sample' and prophet_forecast is not None:
+            X, y = self._build_in_sample_features(time_series_data, prophet_forecast, seasonal_data)
+            logger.info(f"PriceForecastingService[_train_xgboost_corrector] Training XGBoost corrector on {len(X)} in-sample windows")
+        else:
+            X, y = self._build_rolling_features(time_series_data, seasonal_data)
+        
+        if len(X) < 10:
+            return None
         
         try:
             model = xgb.XGBRegressor(
@@ -347,8 +618,71 @@ class PriceForecastingService:
             logger.error(f"PriceForecastingService[_train_xgboost_corrector] Error: {str(e)}")
             return None
     
+    def _series_descriptors(self, time_series_data):
+        prices = time_series_data['avg_price']
+        price_level = float(prices.mean())
+        volatility = float(prices.std()) / price_level if price_level > 0 else 0.0
+        
+        return np.array([
+            np.log1p(max(price_level, 0.0)),
+            volatility,
+            len(time_series_data)
+        ], dtype=float)
+    
+    def _build_global_corrector_inputs(self, time_series_data, prophet_forecast, horizon_forecast, seasonal_data):
+        descriptors = self._series_descriptors(time_series_data)
+        
+        train_features, train_targets = self._build_in_sample_features(time_series_data, prophet_forecast, seasonal_data)
+        train_features = train_features[-GLOBAL_CORRECTOR_ROWS_PER_SERIES:]
+        train_targets = train_targets[-GLOBAL_CORRECTOR_ROWS_PER_SERIES:]
+        valid = train_features[:, 0] > 0
+        
+        horizon_features = self._prepare_xgboost_features(time_series_data, horizon_forecast, seasonal_data)
+        
+        return {
+            'train_X': GlobalCorrector.transform(train_features[valid], descriptors),
+            'train_y': (train_targets[valid] / train_features[valid, 0]).astype(np.float32),
+            'horizon_X': GlobalCorrector.transform(horizon_features, descriptors),
+            'horizon_yhat': horizon_features[:, 0]
+        }
+    
+    def _apply_global_corrector(self, results):
+        corrected = [result for result in results if result.get('corrector_inputs') is not None]
+        inputs = [result.pop('corrector_inputs') for result in corrected]
+        if not corrected:
+            return
+        
+        train_X = np.concatenate([item['train_X'] for item in inputs])
+        train_y = np.concatenate([item['train_y'] for item in inputs])
+        
+        try:
+            if len(train_X) >= self.global_corrector.min_rows:
+                logger.info(f"PriceForecastingService[_apply_global_corrector] Training global corrector on {len(train_X)} rows from {len(corrected)} series")
+                self.global_corrector.fit(train_X, train_y)
+            elif not self.global_corrector.is_ready():
+                logger.info(f"PriceForecastingService[_apply_global_corrector] Only {len(train_X)} training rows and no persisted corrector, keeping Prophet forecasts")
+                return
+            else:
+                logger.info(f"PriceForecastingService[_apply_global_corrector] Only {len(train_X)} training rows, reusing persisted corrector")
+            
+            ratios = self.global_corrector.predict_ratio(np.concatenate([item['horizon_X'] for item in inputs]))
+        except Exception as e:
+            logger.error(f"PriceForecastingService[_apply_global_corrector] Error: {str(e)}")
+            return
+        
+        offset = 0
+        for result, item in zip(corrected, inputs):
+            horizon_yhat = item['horizon_yhat']
+            series_ratios = ratios[offset:offset + len(horizon_yhat)]
+            offset += len(horizon_yhat)
+            
+            prices = np.where(horizon_yhat > 0, horizon_yhat * series_ratios, horizon_yhat).tolist()
+            for point, price in zip(result['forecast_data'], prices):
+                point['price'] = price
+            result['model_info']['correction_model'] = 'xgboost_global'
+    
     def _forecast_price(self, article, brand, forecast_days, time_series_data, seasonal_data):
-        prophet_result = self._build_prophet_model(time_series_data)
+        prophet_result = self._build_prophet_model(time_series_data, article, brand)
         if not prophet_result or prophet_result[0] is None:
             logger.error(f"PriceForecastingService[_forecast_price] Failed to build Prophet model for {article}/{brand}")
             return None
@@ -369,38 +703,30 @@ class PriceForecastingService:
             logger.error(f"PriceForecastingService[_forecast_price] Traceback: {traceback.format_exc()}")
             return None
         
-        if len(time_series_data) > 200:
+        horizon_forecast = prophet_forecast.tail(forecast_days)
+        xgboost_model = None
+        corrector_inputs = None
+        
+        if self.corrector_mode == 'global':
+            corrector_inputs = self._build_global_corrector_inputs(time_series_data, prophet_forecast, horizon_forecast, seasonal_data)
+        elif len(time_series_data) > 200:
             logger.info(f"PriceForecastingService[_forecast_price] Training XGBoost corrector for better accuracy")
-            xgboost_model = self._train_xgboost_corrector(time_series_data, seasonal_data)
+            xgboost_model = self._train_xgboost_corrector(time_series_data, seasonal_data, prophet_forecast)
         else:
             logger.info(f"PriceForecastingService[_forecast_price] Skipping XGBoost corrector for faster processing (data points: {len(time_series_data)})")
-            xgboost_model = None
         
         if xgboost_model:
-            features = self._prepare_xgboost_features(time_series_data, prophet_forecast.tail(forecast_days), seasonal_data)
-            xgboost_predictions = xgboost_model.predict(features)
-            
-            forecast_data = []
-            for idx, (_, row) in enumerate(prophet_forecast.tail(forecast_days).iterrows()):
-                corrected_price = float(xgboost_predictions[idx])
-                confidence_lower = float(row['yhat_lower'])
-                confidence_upper = float(row['yhat_upper'])
-                
-                forecast_data.append({
-                    'date': row['ds'].strftime('%Y-%m-%d'),
-                    'price': corrected_price,
-                    'confidence_lower': confidence_lower,
-                    'confidence_upper': confidence_upper
-                })
+            features = self._prepare_xgboost_features(time_series_data, horizon_forecast, seasonal_data)
+            prices = xgboost_model.predict(features)
         else:
-            forecast_data = []
-            for _, row in prophet_forecast.tail(forecast_days).iterrows():
-                forecast_data.append({
-                    'date': row['ds'].strftime('%Y-%m-%d'),
-                    'price': float(row['yhat']),
-                    'confidence_lower': float(row['yhat_lower']),
-                    'confidence_upper': float(row['yhat_upper'])
-                })
+            prices = horizon_forecast['yhat'].to_numpy()
+        
+        forecast_data = self._build_forecast_data(
+            horizon_forecast['ds'],
+            prices,
+            horizon_forecast['yhat_lower'].to_numpy(),
+            horizon_forecast['yhat_upper'].to_numpy()
+        )
         
         accuracy_metrics = self._calculate_accuracy_metrics(time_series_data, prophet_forecast)
         
@@ -410,7 +736,8 @@ class PriceForecastingService:
             'model_info': {
                 'base_model': 'prophet',
                 'correction_model': 'xgboost' if xgboost_model else None
-            }
+            },
+            'corrector_inputs': corrector_inputs
         }
     
     def _calculate_accuracy_metrics(self, time_series_data, prophet_forecast):
@@ -423,8 +750,11 @@ class PriceForecastingService:
         if len(forecast_historical) != len(test_data):
             return None
         
-        actual = test_data['avg_price'].values
-        predicted = forecast_historical['yhat'].values
+        return self._error_metrics(test_data['avg_price'].values, forecast_historical['yhat'].values)
+    
+    def _error_metrics(self, actual, predicted):
+        actual = np.asarray(actual, dtype=float)
+        predicted = np.asarray(predicted, dtype=float)
         
         mae = np.mean(np.abs(actual - predicted))
         mape = np.mean(np.abs((actual - predicted) / actual)) * 100
@@ -436,8 +766,188 @@ class PriceForecastingService:
             'rmse': float(rmse)
         }
     
-    def _save_to_database(self, results, history_id):
-        if not results:
+    def backtest_corrector(self, article, brand, holdout_days=30):
+        time_series_raw = self._get_time_series_data(article, brand)
+        if not time_series_raw:
+            return {
+                'success': False,
+                'error': f'Not enough data for {article}/{brand}'
+            }
+        
+        time_series = self._prepare_time_series(time_series_raw)
+        if len(time_series) <= holdout_days + CORRECTOR_WINDOW + 10:
+            return {
+                'success': False,
+                'error': f'Series too short for a {holdout_days}-day holdout'
+            }
+        
+        train = time_series.iloc[:-holdout_days]
+        actual = time_series['avg_price'].iloc[-holdout_days:].values
+        seasonal_data = self._get_seasonality_data(article, brand)
+        
+        prophet_result = self._build_prophet_model(train)
+        if not prophet_result or prophet_result[0] is None:
+            return {
+                'success': False,
+                'error': f'Failed to build Prophet model for {article}/{brand}'
+            }
+        
+        prophet_model = prophet_result[0]
+        prophet_forecast = prophet_model.predict(prophet_model.make_future_dataframe(periods=holdout_days))
+        holdout_forecast = prophet_forecast.tail(holdout_days)
+        
+        modes = {
+            'prophet': {
+                'metrics': self._error_metrics(actual, holdout_forecast['yhat'].values),
+                'train_seconds': 0.0
+            }
+        }
+        
+        if self.global_corrector.is_ready():
+            inputs = self._build_global_corrector_inputs(train, prophet_forecast, holdout_forecast, seasonal_data)
+            ratios = self.global_corrector.predict_ratio(inputs['horizon_X'])
+            predicted = np.where(inputs['horizon_yhat'] > 0, inputs['horizon_yhat'] * ratios, inputs['horizon_yhat'])
+            modes['global'] = {
+                'metrics': self._error_metrics(actual, predicted),
+                'train_seconds': 0.0
+            }
+        
+        for mode in SERIES_CORRECTOR_MODES:
+            train_start = time.time()
+            xgboost_model = self._train_xgboost_corrector(train, seasonal_data, prophet_forecast, mode=mode)
+            train_seconds = round(time.time() - train_start, 3)
+            
+            if not xgboost_model:
+                modes[mode] = {'metrics': None, 'train_seconds': train_seconds}
+                continue
+            
+            features = self._prepare_xgboost_features(train, holdout_forecast, seasonal_data)
+            modes[mode] = {
+                'metrics': self._error_metrics(actual, xgboost_model.predict(features)),
+                'train_seconds': train_seconds
+            }
+        
+        return {
+            'success': True,
+            'article': article,
+            'brand': brand,
+            'train_points': len(train),
+            'holdout_days': holdout_days,
+            'modes': modes
+        }
+    
+    def _get_previous_watermarks(self, forecast_days):
+        query = """
+            SELECT 
+                pfr.history_id,
+                pfr.article,
+                pfr.brand,
+                pfr.source_max_order_id,
+                pfr.source_last_date_added
+            FROM price_forecasting_results pfr
+            WHERE pfr.history_id = (
+                SELECT ah.id
+                FROM analysis_history ah
+                WHERE ah.name = 'PRICE_FORECASTING'
+                  AND ah.status = 'SUCCESS'
+                ORDER BY ah.created_at DESC
+                LIMIT 1
+            )
+              AND pfr.source_max_order_id IS NOT NULL
+              AND jsonb_array_length(pfr.forecast_data) = %s
+        """
+        
+        with get_db_cursor() as cursor:
+            cursor.execute(query, (forecast_days,))
+            rows = cursor.fetchall()
+        
+        if not rows:
+            return None, {}
+        
+        watermarks = {
+            (row[1], row[2]): {
+                'max_order_id': int(row[3]),
+                'last_date_added': row[4]
+            }
+            for row in rows
+        }
+        return rows[0][0], watermarks
+    
+    def _split_unchanged(self, combinations, time_series_store, forecast_days):
+        previous_history_id, previous_watermarks = self._get_previous_watermarks(forecast_days)
+        if not previous_history_id:
+            logger.info(f"PriceForecastingService[_split_unchanged] No previous successful run with watermarks, processing all combinations")
+            return combinations, [], None
+        
+        changed = []
+        unchanged = []
+        for combination in combinations:
+            key = (combination['article'], combination['brand'])
+            previous = previous_watermarks.get(key)
+            current = time_series_store.watermark(*key)
+            if (
+                previous
+                and previous['max_order_id'] == current['max_order_id']
+                and pd.Timestamp(previous['last_date_added']) == pd.Timestamp(current['last_date_added'])
+            ):
+                unchanged.append(key)
+            else:
+                changed.append(combination)
+        
+        logger.info(f"PriceForecastingService[_split_unchanged] {len(changed)} changed, {len(unchanged)} unchanged since history_id={previous_history_id}")
+        return changed, unchanged, previous_history_id
+    
+    def _carry_forward_results(self, previous_history_id, history_id, keys):
+        if not keys:
+            return 0
+        
+        query = """
+            INSERT INTO price_forecasting_results 
+            (history_id, article, brand, forecast_data, accuracy_metrics, model_info,
+             source_max_order_id, source_last_date_added, created_at, updated_at)
+            SELECT 
+                %s, pfr.article, pfr.brand, pfr.forecast_data, pfr.accuracy_metrics, pfr.model_info,
+                pfr.source_max_order_id, pfr.source_last_date_added, NOW(), NOW()
+            FROM price_forecasting_results pfr
+            INNER JOIN unnest(%s::text[], %s::text[]) AS carried(article, brand)
+                ON carried.article = pfr.article AND carried.brand = pfr.brand
+            WHERE pfr.history_id = %s
+        """
+        
+        with get_db_cursor() as cursor:
+            cursor.execute(query, (
+                history_id,
+                [key[0] for key in keys],
+                [key[1] for key in keys],
+                previous_history_id
+            ))
+            carried_forward = cursor.rowcount
+        
+        logger.info(f"PriceForecastingService[_carry_forward_results] Carried forward {carried_forward} results from history_id={previous_history_id}")
+        return carried_forward
+    
+    def _insert_in_chunks(self, query, template, rows):
+        saved = 0
+        for start in range(0, len(rows), self.save_batch_size):
+            chunk = rows[start:start + self.save_batch_size]
+            try:
+                with get_db_cursor() as cursor:
+                    execute_values(cursor, query, chunk, template=template, page_size=len(chunk))
+                saved += len(chunk)
+            except Exception as e:
+                logger.warning(f"PriceForecastingService[_insert_in_chunks] Chunk of {len(chunk)} rows failed, retrying row by row: {str(e)}")
+                for row in chunk:
+                    try:
+                        with get_db_cursor() as cursor:
+                            execute_values(cursor, query, [row], template=template)
+                        saved += 1
+                    except Exception as row_error:
+                        logger.error(f"PriceForecastingService[_insert_in_chunks] Error saving {row[1]}/{row[2]}: {str(row_error)}")
+        
+        return saved
+    
+    def _save_to_database(self, results, history_id, carried_forward=0):
+        if not results and not carried_forward:
             if history_id:
                 try:
                     with get_db_cursor() as cursor:
@@ -454,24 +964,28 @@ class PriceForecastingService:
         
         query = """
             INSERT INTO price_forecasting_results 
-            (history_id, article, brand, forecast_data, accuracy_metrics, model_info, created_at, updated_at)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
+            (history_id, article, brand, forecast_data, accuracy_metrics, model_info,
+             source_max_order_id, source_last_date_added, created_at, updated_at)
+            VALUES %s
         """
+        template = "(%s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())"
         
-        for result in results:
-            try:
-                with get_db_cursor() as cursor:
-                    cursor.execute(query, (
-                        history_id,
-                        result['article'],
-                        result['brand'],
-                        json.dumps(result['forecast_data']),
-                        json.dumps(result['accuracy_metrics']) if result['accuracy_metrics'] else None,
-                        json.dumps(result['model_info'])
-                    ))
-            except Exception as e:
-                logger.error(f"PriceForecastingService[_save_to_database] Error saving {result['article']}/{result['brand']}: {str(e)}")
-                continue
+        rows = [
+            (
+                history_id,
+                result['article'],
+                result['brand'],
+                json.dumps(result['forecast_data']),
+                json.dumps(result['accuracy_metrics']) if result['accuracy_metrics'] else None,
+                json.dumps(result['model_info']),
+                (result.get('watermark') or {}).get('max_order_id'),
+                (result.get('watermark') or {}).get('last_date_added')
+            )
+            for result in results
+        ]
+        
+        saved = self._insert_in_chunks(query, template, rows)
+        logger.info(f"PriceForecastingService[_save_to_database] Saved {saved}/{len(rows)} results")
         
         if history_id:
             try:
@@ -486,56 +1000,375 @@ class PriceForecastingService:
             except Exception as db_error:
                 logger.error(f"PriceForecastingService[_save_to_database] Failed to update status: {str(db_error)}")
     
-    def forecast_prices(self, history_id=None, forecast_days=30):
-        start_time = time.time()
+    def _forecast_combination(self, article, brand, forecast_days, time_series_raw=None, seasonal_data=None):
+        if time_series_raw is None:
+            time_series_raw = self._get_time_series_data(article, brand)
+        if not time_series_raw:
+            return None
+        
+        time_series = self._prepare_time_series(time_series_raw)
+        if seasonal_data is None:
+            seasonal_data = self._get_seasonality_data(article, brand)
+        
+        forecast_result = self._forecast_price(article, brand, forecast_days, time_series, seasonal_data)
+        
+        if not forecast_result:
+            return None
+        
+        return {
+            'article': article,
+            'brand': brand,
+            **forecast_result
+        }
+    
+    def _forecast_cache_key(self, article, brand, forecast_days):
+        return f"{FORECAST_CACHE_PREFIX}:{forecast_days}:{article}:{brand}"
+    
+    def _forecast_payload(self, result):
+        return {
+            'article': result['article'],
+            'brand': result['brand'],
+            'forecast_data': result['forecast_data'],
+            'accuracy_metrics': result['accuracy_metrics'],
+            'model_info': result['model_info']
+        }
+    
+    def _get_local_forecast(self, cache_key):
+        with self._local_forecasts_lock:
+            entry = self._local_forecasts.get(cache_key)
+            if not entry:
+                return None
+            if entry[0] < time.monotonic():
+                del self._local_forecasts[cache_key]
+                return None
+            self._local_forecasts.move_to_end(cache_key)
+            return entry[1]
+    
+    def _set_local_forecast(self, cache_key, payload):
+        with self._local_forecasts_lock:
+            self._local_forecasts[cache_key] = (time.monotonic() + LOCAL_FORECAST_CACHE_TTL, payload)
+            self._local_forecasts.move_to_end(cache_key)
+            while len(self._local_forecasts) > LOCAL_FORECAST_CACHE_SIZE:
+                self._local_forecasts.popitem(last=False)
+    
+    def _get_cached_forecast(self, cache_key):
+        if not self.redis_client:
+            return None
+        
+        try:
+            cached = self.redis_client.get(cache_key)
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.error(f"PriceForecastingService[_get_cached_forecast] Error: {str(e)}")
+            return None
+    
+    def _cache_forecasts(self, results, forecast_days):
+        if not self.redis_client or not results:
+            return
+        
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for result in results:
+                pipeline.setex(
+                    self._forecast_cache_key(result['article'], result['brand'], forecast_days),
+                    self.forecast_cache_ttl,
+                    json.dumps(self._forecast_payload(result))
+                )
+            pipeline.execute()
+            logger.info(f"PriceForecastingService[_cache_forecasts] Cached {len(results)} forecasts")
+        except Exception as e:
+            logger.error(f"PriceForecastingService[_cache_forecasts] Error: {str(e)}")
+    
+    def _get_stored_forecast(self, article, brand, forecast_days):
+        query = """
+            SELECT 
+                pfr.forecast_data,
+                pfr.accuracy_metrics,
+                pfr.model_info
+            FROM price_forecasting_results pfr
+            WHERE pfr.history_id = (
+                SELECT ah.id
+                FROM analysis_history ah
+                WHERE ah.name = 'PRICE_FORECASTING'
+                  AND ah.status = 'SUCCESS'
+                ORDER BY ah.created_at DESC
+                LIMIT 1
+            )
+              AND pfr.article = %s
+              AND pfr.brand = %s
+              AND jsonb_array_length(pfr.forecast_data) = %s
+            LIMIT 1
+        """
+        
+        with get_db_cursor() as cursor:
+            cursor.execute(query, (article, brand, forecast_days))
+            row = cursor.fetchone()
+        
+        if not row:
+            return None
+        
+        return {
+            'article': article,
+            'brand': brand,
+            'forecast_data': row[0],
+            'accuracy_metrics': row[1],
+            'model_info': row[2]
+        }
+    
+    def _compute_forecast(self, article, brand, forecast_days):
+        with self._on_demand_slots:
+            result = self._forecast_combination(article, brand, forecast_days)
+            if not result:
+                return None
+            
+            if self.corrector_mode == 'global':
+                self._apply_global_corrector([result])
+            return self._forecast_payload(result)
+    
+    def _coalesce(self, key, func, *args):
+        with self._inflight_lock:
+            future = self._inflight_forecasts.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight_forecasts[key] = future
+        
+        if not owner:
+            return future.result()
         
         try:
-            combinations = self._get_article_brand_combinations()
-            logger.info(f"PriceForecastingService[forecast_prices] Found {len(combinations)} combinations")
+            value = func(*args)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight_forecasts.pop(key, None)
+    
+    def _load_forecast(self, cache_key, article, brand, forecast_days):
+        payload = self._get_cached_forecast(cache_key)
+        if payload:
+            return payload, 'redis'
+        
+        payload = self._get_stored_forecast(article, brand, forecast_days)
+        source = 'database'
+        if not payload:
+            logger.info(f"PriceForecastingService[_load_forecast] No stored forecast for {article}/{brand}, fitting on demand")
+            payload = self._compute_forecast(article, brand, forecast_days)
+            source = 'computed'
+        
+        if payload and self.redis_client:
+            try:
+                self.redis_client.setex(cache_key, self.forecast_cache_ttl, json.dumps(payload))
+            except Exception as e:
+                logger.error(f"PriceForecastingService[_load_forecast] Error caching forecast: {str(e)}")
+        
+        return payload, source
+    
+    def get_forecast(self, article, brand, forecast_days=30):
+        cache_key = self._forecast_cache_key(article, brand, forecast_days)
+        
+        payload = self._get_local_forecast(cache_key)
+        source = 'memory'
+        
+        try:
+            if not payload:
+                payload, source = self._coalesce(cache_key, self._load_forecast, cache_key, article, brand, forecast_days)
+                if payload:
+                    self._set_local_forecast(cache_key, payload)
+        except Exception as e:
+            logger.error(f"PriceForecastingService[get_forecast] Error for {article}/{brand}: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+        
+        if not payload:
+            return {
+                'success': False,
+                'error': f'Not enough data to forecast {article}/{brand}'
+            }
+        
+        return {
+            'success': True,
+            'source': source,
+            **payload
+        }
+    
+    def _forecast_sequential(self, combinations, forecast_days, time_series_store, seasonality):
+        results = []
+        failed = 0
+        
+        for idx, combination in enumerate(combinations, 1):
+            article = combination['article']
+            brand = combination['brand']
             
-            results = []
-            processed = 0
-            failed = 0
+            logger.info(f"PriceForecastingService[forecast_prices] Processing {idx}/{len(combinations)}: article={article}, brand={brand}")
             
-            for idx, combination in enumerate(combinations, 1):
-                article = combination['article']
-                brand = combination['brand']
+            try:
+                result = self._forecast_combination(article, brand, forecast_days, time_series_store.get(article, brand), seasonality.get((article, brand)))
+                if not result:
+                    failed += 1
+                    continue
                 
-                logger.info(f"PriceForecastingService[forecast_prices] Processing {idx}/{len(combinations)}: article={article}, brand={brand}")
+                results.append(result)
                 
-                try:
-                    time_series_raw = self._get_time_series_data(article, brand)
-                    if not time_series_raw:
-                        failed += 1
-                        continue
-                    
-                    time_series = self._prepare_time_series(time_series_raw)
-                    seasonal_data = self._get_seasonality_data(article, brand)
-                    
-                    forecast_result = self._forecast_price(article, brand, forecast_days, time_series, seasonal_data)
+                if len(results) % 10 == 0:
+                    logger.info(f"PriceForecastingService[forecast_prices] Processed {len(results)}/{len(combinations)}")
+            
+            except Exception as e:
+                logger.error(f"PriceForecastingService[forecast_prices] Error processing {article}/{brand}: {str(e)}")
+                failed += 1
+                continue
+        
+        return results, failed
+    
+    def _forecast_linear(self, combinations, forecast_days, time_series_store):
+        series = []
+        for combination in combinations:
+            time_series_raw = time_series_store.get(combination['article'], combination['brand'])
+            series.append((time_series_raw['date'], time_series_raw['avg_price']))
+        
+        try:
+            forecasts = LinearForecaster().fit_predict(series, forecast_days)
+        except Exception as e:
+            logger.error(f"PriceForecastingService[_forecast_linear] Error: {str(e)}")
+            logger.error(f"PriceForecastingService[_forecast_linear] Traceback: {traceback.format_exc()}")
+            return [], len(combinations)
+        
+        results = []
+        failed = 0
+        for combination, forecast in zip(combinations, forecasts):
+            if not np.isfinite(forecast['yhat']).all():
+                failed += 1
+                continue
+            
+            history = pd.DataFrame({'avg_price': forecast['history']})
+            fitted = pd.DataFrame({'yhat': np.concatenate([forecast['history_fitted'], forecast['yhat']])})
+            
+            results.append({
+                'article': combination['article'],
+                'brand': combination['brand'],
+                'forecast_data': self._build_forecast_data(forecast['dates'], forecast['yhat'], forecast['yhat_lower'], forecast['yhat_upper']),
+                'accuracy_metrics': self._calculate_accuracy_metrics(history, fitted),
+                'model_info': {
+                    'base_model': 'linear',
+                    'correction_model': None
+                }
+            })
+        
+        return results, failed
+    
+    def _forecast_parallel(self, combinations, forecast_days, time_series_store, seasonality):
+        results_by_idx = {}
+        failed = 0
+        max_in_flight = self.workers * 2
+        
+        logger.info(f"PriceForecastingService[_forecast_parallel] Forecasting {len(combinations)} combinations on {self.workers} worker processes")
+        
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_forecasting_worker,
+            initargs=(self.corrector_mode, self.model_cache_ttl, self.model_dir)
+        ) as executor:
+            pending = {}
+            combinations_iter = iter(enumerate(combinations))
+            exhausted = False
+            
+            while pending or not exhausted:
+                while not exhausted and len(pending) < max_in_flight:
+                    try:
+                        idx, combination = next(combinations_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    article = combination['article']
+                    brand = combination['brand']
+                    future = executor.submit(_forecast_combination_task, article, brand, forecast_days, time_series_store.get(article, brand), seasonality.get((article, brand)))
+                    pending[future] = (idx, combination)
+                
+                if not pending:
+                    break
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    idx, combination = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"PriceForecastingService[_forecast_parallel] Error processing {combination['article']}/{combination['brand']}: {str(e)}")
+                        result = None
                     
-                    if not forecast_result:
+                    if result:
+                        results_by_idx[idx] = result
+                        if len(results_by_idx) % 10 == 0:
+                            logger.info(f"PriceForecastingService[_forecast_parallel] Processed {len(results_by_idx)}/{len(combinations)}")
+                    else:
                         failed += 1
-                        continue
-                    
-                    result = {
-                        'article': article,
-                        'brand': brand,
-                        **forecast_result
-                    }
-                    results.append(result)
-                    processed += 1
-                    
-                    if processed % 10 == 0:
-                        logger.info(f"PriceForecastingService[forecast_prices] Processed {processed}/{len(combinations)}")
-                
-                except Exception as e:
-                    logger.error(f"PriceForecastingService[forecast_prices] Error processing {article}/{brand}: {str(e)}")
-                    failed += 1
-                    continue
+        
+        return [results_by_idx[idx] for idx in sorted(results_by_idx)], failed
+    
+    def forecast_prices(self, history_id=None, forecast_days=30, incremental=None, engine=None):
+        start_time = time.time()
+        incremental = self.incremental if incremental is None else incremental
+        engine = engine or self.engine
+        
+        if engine not in ENGINES:
+            return {
+                'success': False,
+                'error': f'Неизвестный движок: {engine}',
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }
+        
+        try:
+            time_series_store = load_daily_series()
+            all_combinations = time_series_store.combinations()
+            logger.info(f"PriceForecastingService[forecast_prices] Found {len(all_combinations)} combinations")
+            
+            combinations = all_combinations
+            unchanged = []
+            previous_history_id = None
+            if incremental and history_id:
+                combinations, unchanged, previous_history_id = self._split_unchanged(all_combinations, time_series_store, forecast_days)
+            
+            prophet_combinations = combinations
+            linear_combinations = []
+            if engine == 'linear':
+                prophet_combinations = combinations[:self.prophet_top_n]
+                linear_combinations = combinations[self.prophet_top_n:]
+                logger.info(f"PriceForecastingService[forecast_prices] Linear engine: {len(prophet_combinations)} top combinations on Prophet, {len(linear_combinations)} on least squares")
+            
+            seasonality = self._preload_seasonality(prophet_combinations)
+            
+            if self.workers > 1 and len(prophet_combinations) > 1:
+                results, failed = self._forecast_parallel(prophet_combinations, forecast_days, time_series_store, seasonality)
+            else:
+                results, failed = self._forecast_sequential(prophet_combinations, forecast_days, time_series_store, seasonality)
+            
+            if self.corrector_mode == 'global':
+                self._apply_global_corrector(results)
             
-            if history_id and results:
-                self._save_to_database(results, history_id)
+            if linear_combinations:
+                linear_results, linear_failed = self._forecast_linear(linear_combinations, forecast_days, time_series_store)
+                results.extend(linear_results)
+                failed += linear_failed
+            processed = len(results)
+            
+            for result in results:
+                result['watermark'] = time_series_store.watermark(result['article'], result['brand'])
+            
+            carried_forward = 0
+            if history_id and unchanged:
+                carried_forward = self._carry_forward_results(previous_history_id, history_id, unchanged)
+            
+            if history_id and (results or carried_forward):
+                self._save_to_database(results, history_id, carried_forward)
+                self._cache_forecasts(results, forecast_days)
+                with self._local_forecasts_lock:
+                    self._local_forecasts.clear()
             
             execution_time = round(time.time() - start_time, 2)
             
@@ -543,12 +1376,14 @@ class PriceForecastingService:
                 'success': True,
                 'processed': processed,
                 'failed': failed,
-                'total': len(combinations),
+                'carried_forward': carried_forward,
+                'engine': engine,
+                'total': len(all_combinations),
                 'results_count': len(results),
                 'execution_time': execution_time,
                 'timestamp': datetime.utcnow().isoformat() + 'Z'
             }
-            
+        
         except Exception as e:
             logger.error(f"PriceForecastingService[forecast_prices] Error: {str(e)}")
             
@@ -571,3 +1406,25 @@ class PriceForecastingService:
                 'timestamp': datetime.utcnow().isoformat() + 'Z'
             }
 
+def _init_forecasting_worker(corrector_mode, model_cache_ttl, model_dir):
+    global _worker_service
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    
+    init_prophet_engine(warmup=False)
+    
+    redis_client = None
+    try:
+        redis_client = init_redis_connection()
+    except Exception as e:
+        logger.warning(f"PriceForecastingWorker[_init_forecasting_worker] Redis unavailable, seasonality and model caches disabled: {str(e)}")
+    
+    _worker_service = PriceForecastingService(redis_client, corrector_mode=corrector_mode, model_cache_ttl=model_cache_ttl, model_dir=model_dir)
+    logger.info(f"PriceForecastingWorker[_init_forecasting_worker] Worker {os.getpid()} initialized")
+
+def _forecast_combination_task(article, brand, forecast_days, time_series_raw, seasonal_data):
+    return _worker_service._forecast_combination(article, brand, forecast_days, time_series_raw, seasonal_data)
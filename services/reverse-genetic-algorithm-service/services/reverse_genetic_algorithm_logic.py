@@ -5,11 +5,15 @@ import json
 from datetime import datetime
 import numpy as np
 from deap import base, creator, tools, algorithms
+from psycopg2.extras import execute_values
 from .database import get_db_cursor
 from .connections import get_redis_client
 
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 1000
+RESULT_TOP_N = 100
+
 class ReverseGeneticAlgorithmService:
     def __init__(self, redis_client=None):
         self.redis_client = redis_client
@@ -129,6 +133,29 @@ class ReverseGeneticAlgorithmService:
         
         return best_fitness,
     
+    def _build_score_matrix(self, items):
+        score_matrix = np.array([item['normalized_features'] for item in items], dtype=np.float64)
+        score_matrix[:, [0, 2, 3]] = 1.0 - score_matrix[:, [0, 2, 3]]
+        return score_matrix
+    
+    def _normalize_population_weights(self, individuals):
+        weights_matrix = np.clip(np.array([individual[:6] for individual in individuals], dtype=np.float64), 0.0, None)
+        totals = weights_matrix.sum(axis=1)
+        zero_rows = totals == 0
+        weights_matrix[zero_rows] = 1.0 / 6
+        totals[zero_rows] = 1.0
+        return weights_matrix / totals[:, np.newaxis]
+    
+    def _population_fitness_map(self, evaluate, individuals, score_matrix):
+        individuals = list(individuals)
+        if len(individuals) == 0:
+            return []
+        
+        weights_matrix = self._normalize_population_weights(individuals)
+        best_fitness = (weights_matrix @ score_matrix.T).max(axis=1)
+        
+        return [(float(fitness),) for fitness in best_fitness]
+    
     def _create_individual(self, items):
         weights = [random.uniform(0.0, 1.0) for _ in range(6)]
         total = sum(weights)
@@ -169,11 +196,14 @@ class ReverseGeneticAlgorithmService:
         if not hasattr(creator, "Individual"):
             creator.create("Individual", list, fitness=creator.FitnessMax)
         
+        score_matrix = self._build_score_matrix(items)
+        
         toolbox = base.Toolbox()
         toolbox.register("individual", tools.initIterate, creator.Individual, 
                          lambda: self._create_individual(items))
         toolbox.register("population", tools.initRepeat, list, toolbox.individual)
         toolbox.register("evaluate", self._fitness_function, items=items)
+        toolbox.register("map", self._population_fitness_map, score_matrix=score_matrix)
         toolbox.register("mate", tools.cxBlend, alpha=0.5)
         toolbox.register("mutate", self._mutate_individual, items=items)
         tournsize = min(3, len(items))
@@ -239,17 +269,10 @@ class ReverseGeneticAlgorithmService:
         else:
             best_weights = [1.0/6] * 6
         
-        best_item = None
-        best_fitness = -float('inf')
+        items_fitness = score_matrix @ np.array(best_weights, dtype=np.float64)
+        best_item = items[int(np.argmax(items_fitness))]
         
-        for item in items:
-            fitness = self._calculate_fitness_with_weights(item, best_weights)
-            
-            if fitness > best_fitness:
-                best_fitness = fitness
-                best_item = item
-        
-        return best_item if best_item else items[0], best_weights
+        return best_item, best_weights
     
     def _calculate_fitness_with_weights(self, item, weights):
         features = item['normalized_features']
@@ -272,6 +295,16 @@ class ReverseGeneticAlgorithmService:
         
         return fitness
     
+    def _parse_supplier_row(self, supplier):
+        supplier['supplier_id'] = int(supplier['supplier_id'])
+        supplier['orders_count'] = int(supplier['orders_count'])
+        supplier['total_revenue'] = float(supplier['total_revenue'])
+        supplier['avg_price'] = float(supplier['avg_price'])
+        supplier['success_rate'] = float(supplier['success_rate'])
+        supplier['avg_delivery_time'] = float(supplier['avg_delivery_time'])
+        supplier['denial_rate'] = float(supplier['denial_rate'])
+        return supplier
+    
     def _get_suppliers_for_article_brand(self, article, brand):
         query = """
             SELECT 
@@ -305,22 +338,63 @@ class ReverseGeneticAlgorithmService:
             columns = [desc[0] for desc in cursor.description]
             rows = cursor.fetchall()
         
-        suppliers = []
+        return [self._parse_supplier_row(dict(zip(columns, row))) for row in rows]
+    
+    def _get_suppliers_for_article_brands(self, keys):
+        if not keys:
+            return {}
+        
+        query = """
+            SELECT 
+                order_product.article,
+                order_product.brand,
+                COALESCE(MAX(product_distributor.remote_params->>'service'), MIN(product_distributor.name)) as service_name,
+                MIN(product_distributor.id) as supplier_id,
+                STRING_AGG(DISTINCT product_distributor.name, ', ' ORDER BY product_distributor.name) as supplier_name,
+                COUNT(order_product.id) as orders_count,
+                COALESCE(SUM(order_product.total), 0) as total_revenue,
+                COALESCE(AVG(order_product.price), 0) as avg_price,
+                COALESCE(
+                    SUM(CASE WHEN order_product.is_denied = 0 AND order_product.is_archived = 0 THEN 1 ELSE 0 END)::float / 
+                    NULLIF(COUNT(order_product.id), 0) * 100, 
+                    0
+                ) as success_rate,
+                COALESCE(AVG(order_product.deliverytime_max), 0) as avg_delivery_time,
+                COALESCE(
+                    SUM(CASE WHEN order_product.is_denied = 1 THEN 1 ELSE 0 END)::float / 
+                    NULLIF(COUNT(order_product.id), 0) * 100, 
+                    0
+                ) as denial_rate
+            FROM order_product
+            JOIN unnest(%s::text[], %s::text[]) AS requested(article, brand)
+                ON order_product.article = requested.article 
+                AND order_product.brand = requested.brand
+            JOIN product_distributor ON order_product.distributor_id = product_distributor.id
+            GROUP BY 
+                order_product.article, 
+                order_product.brand, 
+                COALESCE(product_distributor.remote_params->>'service', product_distributor.name)
+            HAVING COUNT(order_product.id) > 0
+            ORDER BY MIN(product_distributor.id)
+        """
+        
+        suppliers_index = {}
+        
+        with get_db_cursor() as cursor:
+            cursor.execute(query, ([key[0] for key in keys], [key[1] for key in keys]))
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
+        
         for row in rows:
-            supplier = dict(zip(columns, row))
-            supplier['supplier_id'] = int(supplier['supplier_id'])
-            supplier['orders_count'] = int(supplier['orders_count'])
-            supplier['total_revenue'] = float(supplier['total_revenue'])
-            supplier['avg_price'] = float(supplier['avg_price'])
-            supplier['success_rate'] = float(supplier['success_rate'])
-            supplier['avg_delivery_time'] = float(supplier['avg_delivery_time'])
-            supplier['denial_rate'] = float(supplier['denial_rate'])
-            suppliers.append(supplier)
-        
-        return suppliers
+            supplier = self._parse_supplier_row(dict(zip(columns, row)))
+            key = (supplier.pop('article'), supplier.pop('brand'))
+            suppliers_index.setdefault(key, []).append(supplier)
+        
+        return suppliers_index
     
-    def _analyze_suppliers_for_article_brand(self, article, brand):
-        suppliers_data = self._get_suppliers_for_article_brand(article, brand)
+    def _analyze_suppliers_for_article_brand(self, article, brand, suppliers_data=None):
+        if suppliers_data is None:
+            suppliers_data = self._get_suppliers_for_article_brand(article, brand)
         
         logger.info(f'ReverseGeneticAlgorithmService[_analyze_suppliers_for_article_brand] article={article}, brand={brand}, suppliers_count={len(suppliers_data)}')
         
@@ -443,10 +517,14 @@ class ReverseGeneticAlgorithmService:
                             }
                         }
                     ],
-                    'execution_time': round(time.time() - start_time, 2)
+                    'execution_time': round(time.time() - start_time, 2),
+                    'timestamp': datetime.utcnow().isoformat() + 'Z',
+                    'combinations_count': 1
                 }
                 
-                self._save_to_database(result_data, history_id)
+                with get_db_cursor() as cursor:
+                    run_id = self._insert_run(cursor, 1, history_id, result_data['execution_time'])
+                    self._save_ranking_chunk(cursor, run_id, [(result_data['all_article_brands_ranking'][0], suppliers)], 1)
                 
                 return result_data
             
@@ -459,49 +537,52 @@ class ReverseGeneticAlgorithmService:
                     'error': 'Ошибка при выполнении генетического алгоритма'
                 }
             
-            all_ranked = []
-            for combination in normalized_combinations:
-                fitness = self._calculate_fitness_with_weights(combination, optimal_weights)
-                all_ranked.append({
-                    'article': combination['article'],
-                    'brand': combination['brand'],
-                    'fitness_score': float(fitness),
-                    'metrics': {
-                        'avg_price': float(combination['avg_price']),
-                        'success_rate': float(combination['success_rate']),
-                        'avg_delivery_time': float(combination['avg_delivery_time']),
-                        'denial_rate': float(combination['denial_rate']),
-                        'orders_count': int(combination['orders_count']),
-                        'total_revenue': float(combination['total_revenue'])
-                    }
-                })
-            
-            all_ranked.sort(key=lambda x: x['fitness_score'], reverse=True)
+            fitness_vector = self._build_score_matrix(normalized_combinations) @ np.array(optimal_weights, dtype=np.float64)
+            ranking_order = np.argsort(-fitness_vector, kind='stable')
             
-            logger.info(f'ReverseGeneticAlgorithmService[find_best_article_brands] Starting processing of {len(all_ranked)} combinations')
+            logger.info(f'ReverseGeneticAlgorithmService[find_best_article_brands] Starting processing of {len(ranking_order)} combinations')
             
-            article_brands_with_suppliers = []
+            best_key = (best_combination['article'], best_combination['brand'])
+            best_combination_suppliers = []
+            top_ranked = []
             
-            for idx, combination in enumerate(all_ranked, 1):
-                if idx % 1000 == 0 or idx == 1:
-                    logger.info(f'ReverseGeneticAlgorithmService[find_best_article_brands] Processing combination {idx}/{len(all_ranked)}')
+            with get_db_cursor() as cursor:
+                run_id = self._insert_run(cursor, len(all_combinations), history_id)
                 
-                suppliers = self._analyze_suppliers_for_article_brand(combination['article'], combination['brand'])
+                for chunk_start in range(0, len(ranking_order), STREAM_CHUNK_SIZE):
+                    ranked_chunk = []
+                    chunk = [
+                        self._build_ranked_combination(normalized_combinations[idx], fitness_vector[idx])
+                        for idx in ranking_order[chunk_start:chunk_start + STREAM_CHUNK_SIZE]
+                    ]
+                    suppliers_index = self._get_suppliers_for_article_brands([(combination['article'], combination['brand']) for combination in chunk])
+                    
+                    for idx, combination in enumerate(chunk, chunk_start + 1):
+                        if idx % 1000 == 0 or idx == 1:
+                            logger.info(f'ReverseGeneticAlgorithmService[find_best_article_brands] Processing combination {idx}/{len(ranking_order)}')
+                        
+                        key = (combination['article'], combination['brand'])
+                        suppliers = self._analyze_suppliers_for_article_brand(
+                            combination['article'],
+                            combination['brand'],
+                            suppliers_index.pop(key, [])
+                        )
+                        if key == best_key:
+                            best_combination_suppliers = suppliers
+                        
+                        ranked_chunk.append((combination, suppliers))
+                    
+                    self._save_ranking_chunk(cursor, run_id, ranked_chunk, chunk_start + 1)
+                    
+                    if len(top_ranked) < RESULT_TOP_N:
+                        top_ranked.extend(chunk[:RESULT_TOP_N - len(top_ranked)])
                 
-                article_brands_with_suppliers.append({
-                    'article': combination['article'],
-                    'brand': combination['brand'],
-                    'fitness_score': combination['fitness_score'],
-                    'metrics': combination['metrics'],
-                    'suppliers_ranking': suppliers
-                })
-            
-            best_combination_suppliers = self._analyze_suppliers_for_article_brand(
-                best_combination['article'], 
-                best_combination['brand']
-            )
-            
-            execution_time = round(time.time() - start_time, 2)
+                execution_time = round(time.time() - start_time, 2)
+                cursor.execute("""
+                    UPDATE reverse_genetic_algorithm_runs 
+                    SET execution_time = %s, updated_at = NOW()
+                    WHERE id = %s
+                """, (execution_time, run_id))
             
             best_combination_fitness = self._calculate_fitness_with_weights(best_combination, optimal_weights)
             
@@ -521,15 +602,12 @@ class ReverseGeneticAlgorithmService:
                     },
                     'suppliers_ranking': best_combination_suppliers
                 },
-                'all_article_brands_ranking': all_ranked,
-                'article_brands_with_suppliers': article_brands_with_suppliers,
+                'all_article_brands_ranking': top_ranked,
                 'execution_time': execution_time,
                 'timestamp': datetime.utcnow().isoformat() + 'Z',
                 'combinations_count': len(all_combinations)
             }
             
-            self._save_to_database(result_data, history_id)
-            
             return result_data
             
         except Exception as e:
@@ -539,98 +617,111 @@ class ReverseGeneticAlgorithmService:
                 'error': str(e)
             }
     
-    def _save_to_database(self, result_data, history_id=None):
-        if not result_data.get('success'):
+    def _build_ranked_combination(self, combination, fitness):
+        return {
+            'article': combination['article'],
+            'brand': combination['brand'],
+            'fitness_score': float(fitness),
+            'metrics': {
+                'avg_price': float(combination['avg_price']),
+                'success_rate': float(combination['success_rate']),
+                'avg_delivery_time': float(combination['avg_delivery_time']),
+                'denial_rate': float(combination['denial_rate']),
+                'orders_count': int(combination['orders_count']),
+                'total_revenue': float(combination['total_revenue'])
+            }
+        }
+    
+    def _insert_run(self, cursor, combinations_count, history_id=None, execution_time=0):
+        if history_id:
+            run_query = """
+                INSERT INTO reverse_genetic_algorithm_runs (history_id, execution_time, combinations_count, created_at, updated_at)
+                VALUES (%s, %s, %s, NOW(), NOW())
+                RETURNING id
+            """
+            cursor.execute(run_query, (history_id, execution_time, combinations_count))
+        else:
+            run_query = """
+                INSERT INTO reverse_genetic_algorithm_runs (execution_time, combinations_count, created_at, updated_at)
+                VALUES (%s, %s, NOW(), NOW())
+                RETURNING id
+            """
+            cursor.execute(run_query, (execution_time, combinations_count))
+        
+        return cursor.fetchone()[0]
+    
+    def _save_ranking_chunk(self, cursor, run_id, ranked_chunk, start_rank):
+        if not ranked_chunk:
             return
         
-        with get_db_cursor() as cursor:
-            if history_id:
-                run_query = """
-                    INSERT INTO reverse_genetic_algorithm_runs (history_id, execution_time, combinations_count, created_at, updated_at)
-                    VALUES (%s, %s, %s, NOW(), NOW())
-                    RETURNING id
-                """
-                cursor.execute(run_query, (
-                    history_id,
-                    result_data.get('execution_time', 0),
-                    result_data.get('combinations_count', 0)
-                ))
-            else:
-                run_query = """
-                    INSERT INTO reverse_genetic_algorithm_runs (execution_time, combinations_count, created_at, updated_at)
-                    VALUES (%s, %s, NOW(), NOW())
-                    RETURNING id
-                """
-                cursor.execute(run_query, (
-                    result_data.get('execution_time', 0),
-                    result_data.get('combinations_count', 0)
-                ))
-            
-            run_id = cursor.fetchone()[0]
-            
-            all_ranked = result_data.get('all_article_brands_ranking', [])
-            article_brands_with_suppliers = result_data.get('article_brands_with_suppliers', [])
+        article_brand_query = """
+            INSERT INTO reverse_genetic_algorithm_article_brand_rankings 
+            (run_id, article, brand, fitness_score, rank, avg_price, success_rate, avg_delivery_time, 
+             denial_rate, orders_count, total_revenue, created_at, updated_at)
+            VALUES %s
+            RETURNING id, article, brand
+        """
+        article_brand_template = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())"
+        
+        article_brand_rows = []
+        for rank, (combination, _) in enumerate(ranked_chunk, start_rank):
+            metrics = combination.get('metrics', {})
+            article_brand_rows.append((
+                run_id,
+                combination['article'],
+                combination['brand'],
+                combination['fitness_score'],
+                rank,
+                metrics.get('avg_price', 0),
+                metrics.get('success_rate', 0),
+                metrics.get('avg_delivery_time', 0),
+                metrics.get('denial_rate', 0),
+                metrics.get('orders_count', 0),
+                metrics.get('total_revenue', 0)
+            ))
+        
+        returned_ids = execute_values(
+            cursor, 
+            article_brand_query, 
+            article_brand_rows, 
+            template=article_brand_template, 
+            page_size=STREAM_CHUNK_SIZE, 
+            fetch=True
+        )
+        article_brand_ranking_ids = {(article, brand): article_brand_id for article_brand_id, article, brand in returned_ids}
+        
+        supplier_query = """
+            INSERT INTO reverse_genetic_algorithm_supplier_rankings 
+            (article_brand_ranking_id, supplier_id, service_name, supplier_name, fitness_score, rank,
+             avg_price, success_rate, avg_delivery_time, denial_rate, orders_count, total_revenue,
+             created_at, updated_at)
+            VALUES %s
+        """
+        supplier_template = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())"
+        
+        supplier_rows = []
+        for combination, suppliers in ranked_chunk:
+            article_brand_id = article_brand_ranking_ids.get((combination['article'], combination['brand']))
             
-            article_brand_ranking_ids = {}
+            if not article_brand_id:
+                continue
             
-            for rank, combination in enumerate(all_ranked, 1):
-                article_brand_query = """
-                    INSERT INTO reverse_genetic_algorithm_article_brand_rankings 
-                    (run_id, article, brand, fitness_score, rank, avg_price, success_rate, avg_delivery_time, 
-                     denial_rate, orders_count, total_revenue, created_at, updated_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
-                    RETURNING id
-                """
-                
-                metrics = combination.get('metrics', {})
-                cursor.execute(article_brand_query, (
-                    run_id,
-                    combination['article'],
-                    combination['brand'],
-                    combination['fitness_score'],
-                    rank,
-                    metrics.get('avg_price', 0),
-                    metrics.get('success_rate', 0),
-                    metrics.get('avg_delivery_time', 0),
-                    metrics.get('denial_rate', 0),
-                    metrics.get('orders_count', 0),
-                    metrics.get('total_revenue', 0)
+            for supplier_rank, supplier in enumerate(suppliers, 1):
+                supplier_metrics = supplier.get('metrics', {})
+                supplier_rows.append((
+                    article_brand_id,
+                    supplier.get('supplier_id', 0),
+                    supplier.get('service_name', ''),
+                    supplier.get('supplier_name', ''),
+                    supplier.get('fitness_score', 0),
+                    supplier_rank,
+                    supplier_metrics.get('avg_price', 0),
+                    supplier_metrics.get('success_rate', 0),
+                    supplier_metrics.get('avg_delivery_time', 0),
+                    supplier_metrics.get('denial_rate', 0),
+                    supplier_metrics.get('orders_count', 0),
+                    supplier_metrics.get('total_revenue', 0)
                 ))
-                article_brand_id = cursor.fetchone()[0]
-                article_brand_ranking_ids[(combination['article'], combination['brand'])] = article_brand_id
-            
-            for item in article_brands_with_suppliers:
-                article = item['article']
-                brand = item['brand']
-                article_brand_id = article_brand_ranking_ids.get((article, brand))
-                
-                if not article_brand_id:
-                    continue
-                
-                suppliers = item.get('suppliers_ranking', [])
-                
-                for supplier_rank, supplier in enumerate(suppliers, 1):
-                    supplier_query = """
-                        INSERT INTO reverse_genetic_algorithm_supplier_rankings 
-                        (article_brand_ranking_id, supplier_id, service_name, supplier_name, fitness_score, rank,
-                         avg_price, success_rate, avg_delivery_time, denial_rate, orders_count, total_revenue,
-                         created_at, updated_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
-                    """
-                    
-                    supplier_metrics = supplier.get('metrics', {})
-                    cursor.execute(supplier_query, (
-                        article_brand_id,
-                        supplier.get('supplier_id', 0),
-                        supplier.get('service_name', ''),
-                        supplier.get('supplier_name', ''),
-                        supplier.get('fitness_score', 0),
-                        supplier_rank,
-                        supplier_metrics.get('avg_price', 0),
-                        supplier_metrics.get('success_rate', 0),
-                        supplier_metrics.get('avg_delivery_time', 0),
-                        supplier_metrics.get('denial_rate', 0),
-                        supplier_metrics.get('orders_count', 0),
-                        supplier_metrics.get('total_revenue', 0)
-                    ))
-
+        
+        if supplier_rows:
+            execute_values(cursor, supplier_query, supplier_rows, template=supplier_template, page_size=STREAM_CHUNK_SIZE)
@@ -2,20 +2,14 @@ import os
 import sys
 import logging
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-try:
-    import cmdstanpy
-    cmdstan_path = cmdstanpy.utils.cmdstan_path()
-    os.environ['CMDSTAN'] = str(cmdstan_path)
-    cmdstanpy.set_cmdstan_path(cmdstan_path)
-except:
-    pass
-
 from services.seasonality_logic import SeasonalityService
+from services.prophet_engine import init_prophet_engine, get_prophet_engine_status
 from services.database import init_db_pool, close_db_pool
 from services.connections import init_redis_connection, close_redis_connection, get_redis_client
 
@@ -46,9 +40,14 @@ async def lifespan(app: FastAPI):
         logger.error(f"Main[lifespan] Failed to initialize database pool: {str(e)}")
         raise
     
+    await run_in_threadpool(init_prophet_engine)
+    
     try:
         redis_client = get_redis_client()
-        seasonality_service = SeasonalityService(redis_client)
+        incremental = os.getenv('SEASONALITY_INCREMENTAL', '0') == '1'
+        save_batch_size = int(os.getenv('SEASONALITY_SAVE_BATCH_SIZE', '1000'))
+        engine = os.getenv('SEASONALITY_ENGINE', 'prophet')
+        seasonality_service = SeasonalityService(redis_client, incremental, save_batch_size, engine)
         logger.info("Main[lifespan] SeasonalityService initialized")
     except Exception as e:
         logger.error(f"Main[lifespan] Failed to initialize SeasonalityService: {str(e)}")
@@ -114,14 +113,15 @@ async def health():
     return {
         "status": status,
         "redis": redis_status,
-        "database": db_status
+        "database": db_status,
+        "prophet_engine": get_prophet_engine_status()
     }
 
 @app.get("/analyze")
-async def analyze_seasonality(history_id: int = None):
+async def analyze_seasonality(history_id: int = None, incremental: bool = None, engine: str = None):
     if not seasonality_service:
         return {"error": "Seasonality service not initialized"}
-    result = seasonality_service.analyze_seasonality(history_id)
+    result = await run_in_threadpool(seasonality_service.analyze_seasonality, history_id, incremental, engine)
     return result
 
 if __name__ == "__main__":
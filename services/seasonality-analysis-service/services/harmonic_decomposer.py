@@ -0,0 +1,98 @@
+import logging
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DAY = np.timedelta64(1, 'D')
+
+class HarmonicDecomposer:
+    def __init__(self, changepoints=10, yearly_order=10, weekly_order=3, ridge=1.0, batch_size=1000):
+        self.changepoints = changepoints
+        self.yearly_order = yearly_order
+        self.weekly_order = weekly_order
+        self.ridge = ridge
+        self.batch_size = batch_size
+    
+    def _design_matrix(self, origin, total_days):
+        day_index = np.arange(total_days, dtype=float)
+        absolute_day = day_index + (origin - np.datetime64('1970-01-01', 'D')) / DAY
+        t = day_index / max(total_days - 1, 1)
+        knots = np.arange(1, self.changepoints + 1) / (self.changepoints + 1)
+        
+        trend = np.column_stack([np.ones(total_days), t, np.maximum(0.0, t[:, None] - knots[None, :])])
+        seasonal = []
+        for period, order in ((365.25, self.yearly_order), (7.0, self.weekly_order)):
+            angles = 2 * np.pi * absolute_day[:, None] * np.arange(1, order + 1)[None, :] / period
+            seasonal.append(np.column_stack([np.sin(angles), np.cos(angles)]))
+        
+        return trend, seasonal[0], seasonal[1]
+    
+    def _penalty(self, n_features):
+        penalty = np.full(n_features, self.ridge)
+        penalty[:2] = 1e-6
+        return np.diag(penalty)
+    
+    def _fit_chunk(self, X, penalty, log_values, observed):
+        weights = observed.astype(float)
+        level = (weights * np.nan_to_num(log_values)).sum(axis=1) / np.maximum(weights.sum(axis=1), 1.0)
+        centered = np.where(observed, log_values - level[:, None], 0.0)
+        
+        n_features = X.shape[1]
+        outer = (X[:, :, None] * X[:, None, :]).reshape(len(X), -1)
+        A = (weights @ outer).reshape(-1, n_features, n_features) + penalty
+        b = (weights * centered) @ X
+        beta = np.linalg.solve(A, b[:, :, None])[:, :, 0]
+        
+        return beta, level
+    
+    def decompose(self, series):
+        if not series:
+            return
+        
+        start_time = time.time()
+        day_series = [dates.astype('datetime64[D]') for dates, _ in series]
+        origin = min(dates[0] for dates in day_series)
+        total_days = int((max(dates[-1] for dates in day_series) - origin) / DAY) + 1
+        X_trend, X_yearly, X_weekly = self._design_matrix(origin, total_days)
+        X = np.hstack([X_trend, X_yearly, X_weekly])
+        penalty = self._penalty(X.shape[1])
+        yearly_columns = slice(X_trend.shape[1], X_trend.shape[1] + X_yearly.shape[1])
+        weekly_columns = slice(yearly_columns.stop, X.shape[1])
+        dates = origin + np.arange(total_days) * DAY
+        
+        for chunk_start in range(0, len(series), self.batch_size):
+            chunk = range(chunk_start, min(chunk_start + self.batch_size, len(series)))
+            actual = np.full((len(chunk), total_days), np.nan)
+            first = np.empty(len(chunk), dtype=np.int64)
+            last = np.empty(len(chunk), dtype=np.int64)
+            
+            for row, position in enumerate(chunk):
+                offsets = ((day_series[position] - origin) / DAY).astype(np.int64)
+                actual[row, offsets] = series[position][1]
+                first[row] = offsets.min()
+                last[row] = offsets.max()
+            
+            observed = actual > 0
+            with np.errstate(invalid='ignore', divide='ignore'):
+                log_values = np.log(actual)
+            beta, level = self._fit_chunk(X, penalty, log_values, observed)
+            
+            log_trend = beta[:, :yearly_columns.start] @ X_trend.T + level[:, None]
+            log_yearly = beta[:, yearly_columns] @ X_yearly.T
+            log_weekly = beta[:, weekly_columns] @ X_weekly.T
+            rows = np.arange(len(chunk))
+            trend = np.exp(log_trend)
+            
+            yield {
+                'positions': chunk,
+                'dates': dates,
+                'actual': np.where(observed, actual, np.nan),
+                'yhat': np.where(observed, np.exp(log_trend + log_yearly + log_weekly), np.nan),
+                'yearly': np.where(observed, np.expm1(log_yearly), np.nan),
+                'weekly': np.where(observed, np.expm1(log_weekly), np.nan),
+                'trend_start': trend[rows, first],
+                'trend_end': trend[rows, last]
+            }
+        
+        logger.info(f"HarmonicDecomposer[decompose] Decomposed {len(series)} series over {total_days} days in {round(time.time() - start_time, 2)}s")
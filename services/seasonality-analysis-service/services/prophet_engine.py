@@ -0,0 +1,80 @@
+import os
+import logging
+import pathlib
+import threading
+import time
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_engine_lock = threading.Lock()
+_engine_status = {
+    'initialized': False,
+    'prophet_version': None,
+    'cmdstan_path': None,
+    'init_seconds': None,
+    'warmup_seconds': None,
+    'error': None
+}
+
+def _warm_up():
+    from prophet import Prophet
+    
+    days = pd.date_range(end=pd.Timestamp.today().normalize(), periods=60, freq='D')
+    df = pd.DataFrame({
+        'ds': days,
+        'y': 100.0 + pd.Series(range(len(days)), dtype=float) % 7
+    })
+    
+    model = Prophet(
+        yearly_seasonality=False,
+        weekly_seasonality=True,
+        daily_seasonality=False,
+        stan_backend='CMDSTANPY'
+    )
+    model.fit(df)
+    model.predict(model.make_future_dataframe(periods=1))
+
+def init_prophet_engine(warmup=True):
+    with _engine_lock:
+        if _engine_status['initialized']:
+            return dict(_engine_status)
+        
+        start_time = time.time()
+        try:
+            import prophet
+            import cmdstanpy
+            _engine_status['prophet_version'] = prophet.__version__
+            
+            try:
+                cmdstan_path = cmdstanpy.utils.cmdstan_path()
+                os.environ['CMDSTAN'] = str(cmdstan_path)
+                cmdstanpy.set_cmdstan_path(cmdstan_path)
+                _engine_status['cmdstan_path'] = str(cmdstan_path)
+                
+                import prophet.models as pm
+                local_cmdstan = pathlib.Path(pm.__file__).parent / 'stan_model' / 'cmdstan-2.33.1'
+                if not local_cmdstan.exists() or not (local_cmdstan / 'makefile').exists():
+                    logger.info(f"ProphetEngine[init_prophet_engine] Bundled CmdStan invalid, using installed: {cmdstan_path}")
+                    pm.CmdStanModel.cmdstan_path = str(cmdstan_path)
+            except Exception as e:
+                logger.warning(f"ProphetEngine[init_prophet_engine] Could not set CmdStan path: {str(e)}")
+            
+            _engine_status['init_seconds'] = round(time.time() - start_time, 3)
+            
+            if warmup:
+                warmup_start = time.time()
+                _warm_up()
+                _engine_status['warmup_seconds'] = round(time.time() - warmup_start, 3)
+            
+            _engine_status['initialized'] = True
+            _engine_status['error'] = None
+            logger.info(f"ProphetEngine[init_prophet_engine] Prophet {_engine_status['prophet_version']} ready, CmdStan: {_engine_status['cmdstan_path']}, init: {_engine_status['init_seconds']}s, warm-up: {_engine_status['warmup_seconds']}s")
+        except Exception as e:
+            _engine_status['error'] = str(e)
+            logger.error(f"ProphetEngine[init_prophet_engine] Error: {str(e)}")
+        
+        return dict(_engine_status)
+
+def get_prophet_engine_status():
+    return dict(_engine_status)
@@ -0,0 +1,66 @@
+import numpy as np
+
+MONTHS = range(1, 13)
+QUARTERS = range(1, 5)
+WEEKDAYS = range(0, 7)
+
+class SeasonalProfile:
+    def __init__(self, dates, anomaly_threshold=3.0):
+        self.dates = np.asarray(dates).astype('datetime64[D]')
+        self.anomaly_threshold = anomaly_threshold
+        
+        month = self.dates.astype('datetime64[M]').astype(np.int64) % 12
+        quarter = month // 3
+        weekday = (self.dates.astype(np.int64) + 3) % 7
+        
+        self.yearly_groups = np.hstack([
+            np.eye(len(MONTHS))[month],
+            np.eye(len(QUARTERS))[quarter]
+        ])
+        self.weekly_groups = np.eye(len(WEEKDAYS))[weekday]
+    
+    def _group_means(self, values, groups):
+        observed = ~np.isnan(values)
+        sums = np.where(observed, values, 0.0) @ groups
+        counts = observed.astype(float) @ groups
+        return np.divide(sums, counts, out=np.ones_like(sums), where=counts > 0)
+    
+    def coefficients(self, yearly, weekly):
+        yearly_means = self._group_means(np.atleast_2d(np.asarray(yearly, dtype=float)), self.yearly_groups)
+        weekly_means = self._group_means(np.atleast_2d(np.asarray(weekly, dtype=float)), self.weekly_groups)
+        
+        return [
+            {
+                'monthly_coefficients': dict(zip(MONTHS, yearly_row[:len(MONTHS)].tolist())),
+                'quarterly_coefficients': dict(zip(QUARTERS, yearly_row[len(MONTHS):].tolist())),
+                'weekly_coefficients': dict(zip(WEEKDAYS, weekly_row.tolist()))
+            }
+            for yearly_row, weekly_row in zip(yearly_means, weekly_means)
+        ]
+    
+    def anomalies(self, actual, expected):
+        actual = np.atleast_2d(np.asarray(actual, dtype=float))
+        expected = np.atleast_2d(np.asarray(expected, dtype=float))
+        residual = actual - expected
+        observed = ~np.isnan(residual)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            counts = observed.sum(axis=1)
+            mean = np.where(observed, residual, 0.0).sum(axis=1) / counts
+            deviation = np.where(observed, residual - mean[:, None], 0.0)
+            std = np.sqrt((deviation ** 2).sum(axis=1) / (counts - 1))
+            flagged = observed & (np.abs(deviation) > (self.anomaly_threshold * std)[:, None]) & (std > 0)[:, None]
+        
+        labels = np.datetime_as_string(self.dates, unit='D')
+        return [
+            [
+                {
+                    'date': str(labels[position]),
+                    'price': float(actual[row, position]),
+                    'expected_price': float(expected[row, position]),
+                    'deviation': float(residual[row, position])
+                }
+                for position in np.flatnonzero(flagged[row])
+            ]
+            for row in range(len(residual))
+        ]
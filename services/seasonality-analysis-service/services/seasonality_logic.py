@@ -6,74 +6,27 @@ from datetime import datetime
 import numpy as np
 import pandas as pd
 from prophet import Prophet
+from psycopg2.extras import execute_values
 from .database import get_db_cursor
 from .connections import get_redis_client
+from .time_series_store import load_daily_series
+from .seasonal_profile import SeasonalProfile
+from .harmonic_decomposer import HarmonicDecomposer
+from .prophet_engine import init_prophet_engine
 
 logger = logging.getLogger(__name__)
 
+ENGINES = ('prophet', 'harmonic')
+
 class SeasonalityService:
-    def __init__(self, redis_client=None):
-        self.redis_client = redis_client
-    
-    def _get_article_brand_combinations(self):
-        query = """
-            SELECT 
-                order_product.article,
-                order_product.brand,
-                COUNT(order_product.id) as orders_count
-            FROM order_product
-            WHERE order_product.is_denied = 0 
-              AND order_product.is_archived = 0
-            GROUP BY order_product.article, order_product.brand
-            HAVING COUNT(order_product.id) >= 300
-            ORDER BY COUNT(order_product.id) DESC
-        """
-        
-        with get_db_cursor() as cursor:
-            cursor.execute(query)
-            columns = [desc[0] for desc in cursor.description]
-            rows = cursor.fetchall()
-        
-        combinations = []
-        for row in rows:
-            combination = dict(zip(columns, row))
-            combinations.append(combination)
-        
-        return combinations
-    
-    def _get_time_series_data(self, article, brand):
-        query = """
-            SELECT 
-                DATE(order_product.date_added) as date,
-                AVG(order_product.price) as avg_price,
-                COUNT(*) as orders_count
-            FROM order_product
-            WHERE order_product.article = %s
-              AND order_product.brand = %s
-              AND order_product.is_denied = 0
-              AND order_product.is_archived = 0
-              AND order_product.date_added IS NOT NULL
-            GROUP BY DATE(order_product.date_added)
-            ORDER BY date ASC
-        """
+    def __init__(self, redis_client=None, incremental=False, save_batch_size=1000, engine='prophet'):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown seasonality engine: {engine}, expected one of {', '.join(ENGINES)}")
         
-        with get_db_cursor() as cursor:
-            cursor.execute(query, (article, brand))
-            columns = [desc[0] for desc in cursor.description]
-            rows = cursor.fetchall()
-        
-        if len(rows) < 30:
-            return None
-        
-        data = []
-        for row in rows:
-            data.append({
-                'date': row[0],
-                'avg_price': float(row[1]) if row[1] else 0.0,
-                'orders_count': int(row[2]) if row[2] else 0
-            })
-        
-        return data
+        self.redis_client = redis_client
+        self.incremental = incremental
+        self.engine = engine
+        self.save_batch_size = max(1, save_batch_size)
     
     def _prepare_time_series(self, raw_data):
         df = pd.DataFrame(raw_data)
@@ -118,29 +71,10 @@ class SeasonalityService:
         if len(df) < 30:
             return None
         
+        init_prophet_engine(warmup=False)
+        
         try:
-            import prophet
-            import cmdstanpy
-            logger.info(f"SeasonalityService[_analyze_seasonality] Prophet version: {prophet.__version__}")
-            logger.info(f"SeasonalityService[_analyze_seasonality] DataFrame shape: {df.shape}, columns: {df.columns.tolist()}")
-            logger.info(f"SeasonalityService[_analyze_seasonality] Data range: {df['ds'].min()} to {df['ds'].max()}")
-            logger.info(f"SeasonalityService[_analyze_seasonality] Price range: {df['y'].min()} to {df['y'].max()}")
-            
-            try:
-                cmdstan_path = cmdstanpy.utils.cmdstan_path()
-                logger.info(f"SeasonalityService[_analyze_seasonality] Using CmdStan path: {cmdstan_path}")
-                import os
-                os.environ['CMDSTAN'] = str(cmdstan_path)
-                cmdstanpy.set_cmdstan_path(cmdstan_path)
-                
-                import prophet.models as pm
-                import pathlib
-                local_cmdstan = pathlib.Path(pm.__file__).parent / 'stan_model' / 'cmdstan-2.33.1'
-                if not local_cmdstan.exists() or not (local_cmdstan / 'makefile').exists():
-                    logger.info(f"SeasonalityService[_analyze_seasonality] Bundled CmdStan invalid, using installed: {cmdstan_path}")
-                    pm.CmdStanModel.cmdstan_path = str(cmdstan_path)
-            except Exception as e:
-                logger.warning(f"SeasonalityService[_analyze_seasonality] Could not set CmdStan path: {str(e)}")
+            logger.info(f"SeasonalityService[_analyze_seasonality] DataFrame shape: {df.shape}, data range: {df['ds'].min()} to {df['ds'].max()}, price range: {df['y'].min()} to {df['y'].max()}")
             
             model = Prophet(
                 yearly_seasonality=True,
@@ -173,29 +107,13 @@ class SeasonalityService:
             logger.error(f"SeasonalityService[_analyze_seasonality] Traceback: {traceback.format_exc()}")
             return None
         
-        monthly_coefficients = {}
-        for month in range(1, 13):
-            month_data = forecast[forecast['ds'].dt.month == month]
-            if len(month_data) > 0 and 'yearly' in month_data.columns:
-                monthly_coefficients[month] = float(month_data['yearly'].mean())
-            else:
-                monthly_coefficients[month] = 1.0
-        
-        quarterly_coefficients = {}
-        for quarter in range(1, 5):
-            quarter_data = forecast[forecast['ds'].dt.quarter == quarter]
-            if len(quarter_data) > 0 and 'yearly' in quarter_data.columns:
-                quarterly_coefficients[quarter] = float(quarter_data['yearly'].mean())
-            else:
-                quarterly_coefficients[quarter] = 1.0
-        
-        weekly_coefficients = {}
-        for day in range(0, 7):
-            day_data = forecast[forecast['ds'].dt.dayofweek == day]
-            if len(day_data) > 0 and 'weekly' in day_data.columns:
-                weekly_coefficients[day] = float(day_data['weekly'].mean())
-            else:
-                weekly_coefficients[day] = 1.0
+        merged = forecast.merge(df, on='ds', how='left')
+        missing = np.full(len(merged), np.nan)
+        profile = SeasonalProfile(merged['ds'].to_numpy())
+        coefficients = profile.coefficients(
+            merged['yearly'].to_numpy(dtype=float) if 'yearly' in merged.columns else missing,
+            merged['weekly'].to_numpy(dtype=float) if 'weekly' in merged.columns else missing
+        )[0]
         
         if 'trend' not in forecast.columns:
             trend_start = df['y'].iloc[0]
@@ -204,51 +122,211 @@ class SeasonalityService:
             trend_start = forecast['trend'].iloc[0]
             trend_end = forecast['trend'].iloc[-1]
         
+        trend = self._build_trend(trend_start, trend_end)
+        
+        anomalies = profile.anomalies(merged['y'].to_numpy(dtype=float), merged['yhat'].to_numpy(dtype=float))[0]
+        
+        return {
+            **coefficients,
+            'trend': trend,
+            'anomalies': anomalies
+        }
+    
+    def _build_trend(self, trend_start, trend_end):
         trend_direction = 'increasing' if trend_end > trend_start else 'decreasing' if trend_end < trend_start else 'stable'
         trend_strength = abs(trend_end - trend_start) / trend_start if trend_start > 0 else 0.0
         
-        trend = {
+        return {
             'direction': trend_direction,
             'strength': float(trend_strength),
             'current_value': float(trend_end)
         }
+    
+    def _analyze_prophet(self, combinations, time_series_store):
+        results = []
+        failed = 0
+        
+        for combination in combinations:
+            article = combination['article']
+            brand = combination['brand']
+            
+            try:
+                time_series_raw = time_series_store.get(article, brand)
+                if not time_series_raw:
+                    logger.warning(f"SeasonalityService[analyze_seasonality] No time series data for {article}/{brand}")
+                    failed += 1
+                    continue
+                
+                logger.info(f"SeasonalityService[analyze_seasonality] Got {len(time_series_raw['date'])} data points for {article}/{brand}")
+                time_series = self._prepare_time_series(time_series_raw)
+                seasonality_data = self._analyze_seasonality(time_series)
+                
+                if not seasonality_data:
+                    logger.warning(f"SeasonalityService[analyze_seasonality] No seasonality data for {article}/{brand}")
+                    failed += 1
+                    continue
+                
+                results.append({
+                    'article': article,
+                    'brand': brand,
+                    **seasonality_data
+                })
+                
+                if len(results) % 10 == 0:
+                    logger.info(f"SeasonalityService[analyze_seasonality] Processed {len(results)}/{len(combinations)}")
+            
+            except Exception as e:
+                logger.error(f"SeasonalityService[analyze_seasonality] Error processing {article}/{brand}: {str(e)}")
+                failed += 1
+                continue
         
-        anomalies = self._detect_anomalies(df, forecast)
+        return results, failed
+    
+    def _analyze_harmonic(self, combinations, time_series_store):
+        series = []
+        for combination in combinations:
+            time_series_raw = time_series_store.get(combination['article'], combination['brand'])
+            series.append((time_series_raw['date'], time_series_raw['avg_price']))
         
-        return {
-            'monthly_coefficients': monthly_coefficients,
-            'quarterly_coefficients': quarterly_coefficients,
-            'weekly_coefficients': weekly_coefficients,
-            'trend': trend,
-            'anomalies': anomalies
+        results = []
+        failed = 0
+        try:
+            for chunk in HarmonicDecomposer().decompose(series):
+                profile = SeasonalProfile(chunk['dates'])
+                coefficients = profile.coefficients(chunk['yearly'], chunk['weekly'])
+                anomalies = profile.anomalies(chunk['actual'], chunk['yhat'])
+                
+                for row, position in enumerate(chunk['positions']):
+                    trend_start = chunk['trend_start'][row]
+                    trend_end = chunk['trend_end'][row]
+                    if not (np.isfinite(trend_start) and np.isfinite(trend_end)):
+                        failed += 1
+                        continue
+                    
+                    results.append({
+                        'article': combinations[position]['article'],
+                        'brand': combinations[position]['brand'],
+                        **coefficients[row],
+                        'trend': self._build_trend(trend_start, trend_end),
+                        'anomalies': anomalies[row]
+                    })
+        except Exception as e:
+            logger.error(f"SeasonalityService[_analyze_harmonic] Error: {str(e)}")
+            logger.error(f"SeasonalityService[_analyze_harmonic] Traceback: {traceback.format_exc()}")
+            return [], len(combinations)
+        
+        return results, failed
+    
+    def _get_previous_watermarks(self):
+        query = """
+            SELECT 
+                sar.history_id,
+                sar.article,
+                sar.brand,
+                sar.source_max_order_id,
+                sar.source_last_date_added
+            FROM seasonality_analysis_results sar
+            WHERE sar.history_id = (
+                SELECT ah.id
+                FROM analysis_history ah
+                WHERE ah.name = 'SEASONALITY_ANALYSIS'
+                  AND ah.status = 'SUCCESS'
+                ORDER BY ah.created_at DESC
+                LIMIT 1
+            )
+              AND sar.source_max_order_id IS NOT NULL
+        """
+        
+        with get_db_cursor() as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        
+        if not rows:
+            return None, {}
+        
+        watermarks = {
+            (row[1], row[2]): {
+                'max_order_id': int(row[3]),
+                'last_date_added': row[4]
+            }
+            for row in rows
         }
+        return rows[0][0], watermarks
     
-    def _detect_anomalies(self, df, forecast):
-        df_merged = df.merge(forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']], on='ds')
-        df_merged['residual'] = df_merged['y'] - df_merged['yhat']
+    def _split_unchanged(self, combinations, time_series_store):
+        previous_history_id, previous_watermarks = self._get_previous_watermarks()
+        if not previous_history_id:
+            logger.info(f"SeasonalityService[_split_unchanged] No previous successful run with watermarks, processing all combinations")
+            return combinations, [], None
         
-        mean_residual = df_merged['residual'].mean()
-        std_residual = df_merged['residual'].std()
+        changed = []
+        unchanged = []
+        for combination in combinations:
+            key = (combination['article'], combination['brand'])
+            previous = previous_watermarks.get(key)
+            current = time_series_store.watermark(*key)
+            if (
+                previous
+                and previous['max_order_id'] == current['max_order_id']
+                and pd.Timestamp(previous['last_date_added']) == pd.Timestamp(current['last_date_added'])
+            ):
+                unchanged.append(key)
+            else:
+                changed.append(combination)
         
-        if std_residual == 0:
-            return []
+        logger.info(f"SeasonalityService[_split_unchanged] {len(changed)} changed, {len(unchanged)} unchanged since history_id={previous_history_id}")
+        return changed, unchanged, previous_history_id
+    
+    def _carry_forward_results(self, previous_history_id, history_id, keys):
+        if not keys:
+            return 0
         
-        threshold = 3 * std_residual
-        anomalies = df_merged[
-            (df_merged['residual'] > mean_residual + threshold) | 
-            (df_merged['residual'] < mean_residual - threshold)
-        ]
+        query = """
+            INSERT INTO seasonality_analysis_results 
+            (history_id, article, brand, monthly_coefficients, quarterly_coefficients, 
+             weekly_coefficients, trend, anomalies, source_max_order_id, source_last_date_added,
+             created_at, updated_at)
+            SELECT 
+                %s, sar.article, sar.brand, sar.monthly_coefficients, sar.quarterly_coefficients,
+                sar.weekly_coefficients, sar.trend, sar.anomalies, sar.source_max_order_id, sar.source_last_date_added,
+                NOW(), NOW()
+            FROM seasonality_analysis_results sar
+            INNER JOIN unnest(%s::text[], %s::text[]) AS carried(article, brand)
+                ON carried.article = sar.article AND carried.brand = sar.brand
+            WHERE sar.history_id = %s
+        """
         
-        anomaly_list = []
-        for idx, row in anomalies.iterrows():
-            anomaly_list.append({
-                'date': row['ds'].strftime('%Y-%m-%d'),
-                'price': float(row['y']),
-                'expected_price': float(row['yhat']),
-                'deviation': float(row['residual'])
-            })
+        with get_db_cursor() as cursor:
+            cursor.execute(query, (
+                history_id,
+                [key[0] for key in keys],
+                [key[1] for key in keys],
+                previous_history_id
+            ))
+            carried_forward = cursor.rowcount
         
-        return anomaly_list
+        logger.info(f"SeasonalityService[_carry_forward_results] Carried forward {carried_forward} results from history_id={previous_history_id}")
+        return carried_forward
+    
+    def _insert_in_chunks(self, query, template, rows):
+        saved = 0
+        for start in range(0, len(rows), self.save_batch_size):
+            chunk = rows[start:start + self.save_batch_size]
+            try:
+                with get_db_cursor() as cursor:
+                    execute_values(cursor, query, chunk, template=template, page_size=len(chunk))
+                saved += len(chunk)
+            except Exception as e:
+                logger.warning(f"SeasonalityService[_insert_in_chunks] Chunk of {len(chunk)} rows failed, retrying row by row: {str(e)}")
+                for row in chunk:
+                    try:
+                        with get_db_cursor() as cursor:
+                            execute_values(cursor, query, [row], template=template)
+                        saved += 1
+                    except Exception as row_error:
+                        logger.error(f"SeasonalityService[_insert_in_chunks] Error saving {row[1]}/{row[2]}: {str(row_error)}")
+        
+        return saved
     
     def _save_to_database(self, results, history_id):
         if not results:
@@ -257,94 +335,89 @@ class SeasonalityService:
         query = """
             INSERT INTO seasonality_analysis_results 
             (history_id, article, brand, monthly_coefficients, quarterly_coefficients, 
-             weekly_coefficients, trend, anomalies, created_at, updated_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
+             weekly_coefficients, trend, anomalies, source_max_order_id, source_last_date_added,
+             created_at, updated_at)
+            VALUES %s
         """
+        template = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())"
         
-        for result in results:
-            try:
-                with get_db_cursor() as cursor:
-                    cursor.execute(query, (
-                        history_id,
-                        result['article'],
-                        result['brand'],
-                        json.dumps(result['monthly_coefficients']),
-                        json.dumps(result['quarterly_coefficients']),
-                        json.dumps(result['weekly_coefficients']),
-                        json.dumps(result['trend']),
-                        json.dumps(result['anomalies']) if result['anomalies'] else None
-                    ))
-            except Exception as e:
-                logger.error(f"SeasonalityService[_save_to_database] Error saving {result['article']}/{result['brand']}: {str(e)}")
-                continue
+        rows = [
+            (
+                history_id,
+                result['article'],
+                result['brand'],
+                json.dumps(result['monthly_coefficients']),
+                json.dumps(result['quarterly_coefficients']),
+                json.dumps(result['weekly_coefficients']),
+                json.dumps(result['trend']),
+                json.dumps(result['anomalies']) if result['anomalies'] else None,
+                (result.get('watermark') or {}).get('max_order_id'),
+                (result.get('watermark') or {}).get('last_date_added')
+            )
+            for result in results
+        ]
+        
+        saved = self._insert_in_chunks(query, template, rows)
+        logger.info(f"SeasonalityService[_save_to_database] Saved {saved}/{len(rows)} results")
     
-    def analyze_seasonality(self, history_id=None):
+    def analyze_seasonality(self, history_id=None, incremental=None, engine=None):
         start_time = time.time()
+        incremental = self.incremental if incremental is None else incremental
+        engine = engine or self.engine
+        
+        if engine not in ENGINES:
+            return {
+                'success': False,
+                'error': f'Неизвестный движок: {engine}',
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
+            }
         
         try:
-            combinations = self._get_article_brand_combinations()
-            logger.info(f"SeasonalityService[analyze_seasonality] Found {len(combinations)} combinations")
+            time_series_store = load_daily_series()
+            all_combinations = time_series_store.combinations()
+            logger.info(f"SeasonalityService[analyze_seasonality] Found {len(all_combinations)} combinations")
             
-            results = []
-            processed = 0
-            failed = 0
+            combinations = all_combinations
+            unchanged = []
+            previous_history_id = None
+            if incremental and history_id:
+                combinations, unchanged, previous_history_id = self._split_unchanged(all_combinations, time_series_store)
             
-            for combination in combinations:
-                article = combination['article']
-                brand = combination['brand']
-                
-                try:
-                    time_series_raw = self._get_time_series_data(article, brand)
-                    if not time_series_raw:
-                        logger.warning(f"SeasonalityService[analyze_seasonality] No time series data for {article}/{brand}")
-                        failed += 1
-                        continue
-                    
-                    logger.info(f"SeasonalityService[analyze_seasonality] Got {len(time_series_raw)} data points for {article}/{brand}")
-                    time_series = self._prepare_time_series(time_series_raw)
-                    seasonality_data = self._analyze_seasonality(time_series)
-                    
-                    if not seasonality_data:
-                        logger.warning(f"SeasonalityService[analyze_seasonality] No seasonality data for {article}/{brand}")
-                        failed += 1
-                        continue
-                    
-                    result = {
-                        'article': article,
-                        'brand': brand,
-                        **seasonality_data
-                    }
-                    results.append(result)
-                    processed += 1
-                    
-                    if processed % 10 == 0:
-                        logger.info(f"SeasonalityService[analyze_seasonality] Processed {processed}/{len(combinations)}")
-                
-                except Exception as e:
-                    logger.error(f"SeasonalityService[analyze_seasonality] Error processing {article}/{brand}: {str(e)}")
-                    failed += 1
-                    continue
+            if engine == 'harmonic':
+                results, failed = self._analyze_harmonic(combinations, time_series_store)
+            else:
+                results, failed = self._analyze_prophet(combinations, time_series_store)
+            processed = len(results)
+            
+            for result in results:
+                result['watermark'] = time_series_store.watermark(result['article'], result['brand'])
             
             logger.info(f"SeasonalityService[analyze_seasonality] Total processed: {processed}, failed: {failed}, results: {len(results)}")
             
             if history_id and results:
                 logger.info(f"SeasonalityService[analyze_seasonality] Saving {len(results)} results to database")
                 self._save_to_database(results, history_id)
-            elif history_id and not results:
+            elif history_id and not results and not unchanged:
                 logger.warning(f"SeasonalityService[analyze_seasonality] No results to save for history_id {history_id}")
             
+            carried_forward = 0
+            if history_id and unchanged:
+                carried_forward = self._carry_forward_results(previous_history_id, history_id, unchanged)
+            
             execution_time = round(time.time() - start_time, 2)
             
             return {
                 'success': True,
                 'processed': processed,
                 'failed': failed,
-                'total': len(combinations),
+                'carried_forward': carried_forward,
+                'engine': engine,
+                'total': len(all_combinations),
                 'results_count': len(results),
                 'execution_time': execution_time,
                 'timestamp': datetime.utcnow().isoformat() + 'Z'
             }
-            
+        
         except Exception as e:
             logger.error(f"SeasonalityService[analyze_seasonality] Error: {str(e)}")
             return {
@@ -0,0 +1,138 @@
+import logging
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from .database import get_db_cursor
+
+logger = logging.getLogger(__name__)
+
+SPOOL_MAX_SIZE = 64 * 1024 * 1024
+
+DAILY_SERIES_QUERY = """
+    SELECT article, brand, date, avg_price, orders_count, total_orders, max_order_id, last_date_added
+    FROM (
+        SELECT
+            order_product.article,
+            order_product.brand,
+            DATE(order_product.date_added) as date,
+            AVG(order_product.price) as avg_price,
+            COUNT(*) as orders_count,
+            COUNT(DATE(order_product.date_added)) OVER (PARTITION BY order_product.article, order_product.brand) as days_count,
+            SUM(COUNT(order_product.id)) OVER (PARTITION BY order_product.article, order_product.brand) as total_orders,
+            MAX(MAX(order_product.id)) OVER (PARTITION BY order_product.article, order_product.brand) as max_order_id,
+            MAX(MAX(order_product.date_added)) OVER (PARTITION BY order_product.article, order_product.brand) as last_date_added
+        FROM order_product
+        WHERE order_product.is_denied = 0
+          AND order_product.is_archived = 0
+          AND order_product.article IS NOT NULL
+          AND order_product.brand IS NOT NULL
+        GROUP BY order_product.article, order_product.brand, DATE(order_product.date_added)
+    ) daily
+    WHERE daily.date IS NOT NULL
+      AND daily.days_count >= %s
+      AND daily.total_orders >= %s
+    ORDER BY article, brand, date
+"""
+
+class TimeSeriesStore:
+    def __init__(self, articles, brands, dates, avg_price, orders_count, starts, ends, total_orders, max_order_ids, last_dates_added):
+        self.dates = dates
+        self.avg_price = avg_price
+        self.orders_count = orders_count
+        self.starts = starts
+        self.ends = ends
+        self.keys = list(zip(articles, brands))
+        self.total_orders = total_orders
+        self.max_order_ids = max_order_ids
+        self.last_dates_added = last_dates_added
+        self.index = {key: position for position, key in enumerate(self.keys)}
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def __contains__(self, key):
+        return key in self.index
+    
+    def combinations(self):
+        order = np.argsort(-self.total_orders, kind='stable')
+        return [
+            {
+                'article': self.keys[position][0],
+                'brand': self.keys[position][1],
+                'orders_count': int(self.total_orders[position])
+            }
+            for position in order
+        ]
+    
+    def get(self, article, brand):
+        position = self.index.get((article, brand))
+        if position is None:
+            return None
+        
+        start = self.starts[position]
+        end = self.ends[position]
+        return {
+            'date': self.dates[start:end],
+            'avg_price': self.avg_price[start:end],
+            'orders_count': self.orders_count[start:end]
+        }
+    
+    def watermark(self, article, brand):
+        position = self.index.get((article, brand))
+        if position is None:
+            return None
+        
+        return {
+            'max_order_id': int(self.max_order_ids[position]),
+            'last_date_added': pd.Timestamp(self.last_dates_added[position]).to_pydatetime()
+        }
+    
+    @classmethod
+    def from_frame(cls, frame):
+        articles = frame['article'].to_numpy(dtype=object)
+        brands = frame['brand'].to_numpy(dtype=object)
+        
+        if len(frame) == 0:
+            empty = np.array([], dtype=np.int64)
+            return cls([], [], frame['date'].to_numpy(), np.array([], dtype=float), empty, empty, empty, empty, empty, frame['last_date_added'].to_numpy())
+        
+        boundaries = np.flatnonzero((articles[1:] != articles[:-1]) | (brands[1:] != brands[:-1])) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(frame)]))
+        
+        return cls(
+            articles[starts],
+            brands[starts],
+            frame['date'].to_numpy(),
+            frame['avg_price'].fillna(0.0).to_numpy(dtype=float),
+            frame['orders_count'].to_numpy(dtype=np.int64),
+            starts,
+            ends,
+            frame['total_orders'].to_numpy(dtype=np.int64)[starts],
+            frame['max_order_id'].to_numpy(dtype=np.int64)[starts],
+            frame['last_date_added'].to_numpy()[starts]
+        )
+
+def load_daily_series(min_days=30, min_orders=300):
+    start_time = time.time()
+    
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as buffer:
+        with get_db_cursor() as cursor:
+            query = cursor.mogrify(DAILY_SERIES_QUERY, (min_days, min_orders)).decode()
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", buffer)
+        
+        buffer.seek(0)
+        frame = pd.read_csv(
+            buffer,
+            header=None,
+            names=['article', 'brand', 'date', 'avg_price', 'orders_count', 'total_orders', 'max_order_id', 'last_date_added'],
+            dtype={'article': str, 'brand': str, 'avg_price': float, 'orders_count': np.int64, 'total_orders': np.int64, 'max_order_id': np.int64},
+            parse_dates=['date', 'last_date_added'],
+            keep_default_na=False,
+            na_values={'avg_price': ['']}
+        )
+    
+    store = TimeSeriesStore.from_frame(frame)
+    logger.info(f"TimeSeriesStore[load_daily_series] Loaded {len(frame)} daily rows for {len(store)} combinations in {round(time.time() - start_time, 2)}s")
+    return store